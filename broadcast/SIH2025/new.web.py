@@ -7,6 +7,8 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import io
 import time
+import struct
+from serial_frame import read_frames
 
 # ====== Flask App ======
 app = Flask(__name__)
@@ -28,18 +30,25 @@ camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 PRESENCE_THRESHOLD = 65   # Changed to 65% minimum
 SMOOTH_WINDOW = 5         # number of readings for smoothing
 
+# ====== Serial Frame ======
+# Binary frame sent by src/co2+live.cpp:
+#   0xAA | float32 co2 | float32 presence (little-endian) | CRC-8 of the 8 payload bytes
+# (sync, CRC and resync live in serial_frame.py)
+FRAME = struct.Struct('<ff')
+
 # ====== Serial Reading Thread ======
 def read_serial():
     global co2_values, presence_values
     buffer = []
+    pending = bytearray()
     while True:
         try:
-            line = ser.readline().decode().strip()
-            if ',' in line:
-                co2, presence = line.split(',')
-                co2_values.append(float(co2))
+            # drain everything the driver has; block for 1 byte when idle
+            pending += ser.read(ser.in_waiting or 1)
+            for co2, presence in read_frames(pending, FRAME):
+                co2_values.append(co2)
                 
-                val = float(presence)
+                val = presence
                 buffer.append(val)
                 if len(buffer) > SMOOTH_WINDOW:
                     buffer.pop(0)
@@ -0,0 +1,42 @@
+"""Binary serial frame shared by the dashboards and the ESP32 sketches in src/
+
+Every frame is  0xAA | payload | CRC-8 (poly 0x07) of the payload bytes.
+The payload layout depends on the sketch, so callers pass its struct.Struct:
+
+    src/co2+live.cpp      '<ff'   float32 co2, float32 presence
+    src/co2+distance.cpp  '<HBf'  uint16 co2 ppm, uint8 presence, float32 distance m
+"""
+
+FRAME_SYNC = 0xAA
+
+def _crc8_table(poly=0x07):
+    table = []
+    for b in range(256):
+        crc = b
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+CRC8 = _crc8_table()
+
+def crc8(buf, start, end):
+    crc = 0
+    for i in range(start, end):
+        crc = CRC8[crc ^ buf[i]]
+    return crc
+
+def read_frames(pending, frame):
+    """Pull every complete, CRC-valid `frame` out of pending; drop consumed bytes"""
+    frame_len = 1 + frame.size + 1
+    samples = []
+    i = pending.find(FRAME_SYNC)
+    while i >= 0 and len(pending) - i >= frame_len:
+        end = i + frame_len - 1
+        if crc8(pending, i + 1, end) == pending[end]:
+            samples.append(frame.unpack_from(pending, i + 1))
+            i = pending.find(FRAME_SYNC, end + 1)
+        else:
+            i = pending.find(FRAME_SYNC, i + 1)   # 0xAA inside a payload, resync
+    del pending[:len(pending) if i < 0 else i]
+    return samples
@@ -2,12 +2,14 @@ from flask import Flask, Response, render_template_string, request, redirect
 import cv2
 import serial
 import threading
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import io
+import queue
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
 import time
-import RPi.GPIO as GPIO
+import struct
+from serial_frame import read_frames
+import pigpio
 
 # ================= Flask =================
 app = Flask(__name__)
@@ -16,88 +18,220 @@ app = Flask(__name__)
 ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
 time.sleep(2)
 
-co2_values = []
-presence_values = []
+class Ring:
+    # fixed-size float32 history; append overwrites the oldest sample in place.
+    # Written by the serial thread and read by graph threads, so both sides lock.
+    def __init__(self, size):
+        self.buf = np.zeros(size, dtype=np.float32)
+        self.idx = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        with self.lock:
+            self.buf[self.idx] = value
+            self.idx = (self.idx + 1) % len(self.buf)
+            self.count = min(self.count + 1, len(self.buf))
+
+    def values(self):
+        # chronological snapshot, oldest first; plot it outside the lock
+        with self.lock:
+            if self.count < len(self.buf):
+                return self.buf[:self.count].copy()
+            return np.roll(self.buf, -self.idx)
+
+HISTORY = 50   # points kept per series
+co2_values = Ring(HISTORY)
+presence_values = Ring(HISTORY)
 
 # ================= Camera =================
-camera = cv2.VideoCapture(0)
+camera = cv2.VideoCapture(0, cv2.CAP_V4L2)
+camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
 camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
 camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+# If the driver really delivers MJPG, skip OpenCV's decode and hand the raw
+# JPEG through untouched (see encode_frames)
+if int(camera.get(cv2.CAP_PROP_FOURCC)) == cv2.VideoWriter_fourcc(*'MJPG'):
+    camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+latest_frame = None
+frame_lock = threading.Lock()
+
+# newest JPEG part, shared by every /camera client
+enc_cv = threading.Condition()
+enc_frame = None
+enc_seq = 0
+
+# multipart MJPEG part framing
+JPEG_HDR = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+PART_END = b'\r\n'
 
 PRESENCE_THRESHOLD = 30
 SMOOTH_WINDOW = 5
+ALPHA = 2.0 / (SMOOTH_WINDOW + 1)   # EMA weight, same lag as a SMOOTH_WINDOW SMA
 
 # ================= Stepper GPIO =================
 STEP = 20
 DIR  = 21
 EN   = 16
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup([STEP, DIR, EN], GPIO.OUT)
-GPIO.output(EN, GPIO.LOW)   # enable driver
+pi = pigpio.pi()   # needs the pigpiod daemon (sudo pigpiod)
+for pin in (STEP, DIR, EN):
+    pi.set_mode(pin, pigpio.OUTPUT)
+pi.write(EN, 0)   # enable driver
 
 STEPS_PER_REV = 200   # change if microstepping
 STEP_DELAY = 0.001
+STEP_US = int(STEP_DELAY * 1e6)
+STEP_MASK = 1 << STEP
+
+# one STEP pulse (high then low for STEP_DELAY each), replayed by the DMA engine
+pi.wave_clear()
+pi.wave_add_generic([
+    pigpio.pulse(STEP_MASK, 0, STEP_US),
+    pigpio.pulse(0, STEP_MASK, STEP_US),
+])
+STEP_WAVE = pi.wave_create()
 
 # ================= Serial Read =================
+# Binary frame sent by src/co2+live.cpp:
+#   0xAA | float32 co2 | float32 presence (little-endian) | CRC-8 of the 8 payload bytes
+# (sync, CRC and resync live in serial_frame.py)
+FRAME = struct.Struct('<ff')
+
 def read_serial():
-    buffer = []
+    ema = None
+    pending = bytearray()
     while True:
         try:
-            line = ser.readline().decode().strip()
-            if ',' in line:
-                co2, presence = line.split(',')
-                co2_values.append(float(co2))
-
-                buffer.append(float(presence))
-                if len(buffer) > SMOOTH_WINDOW:
-                    buffer.pop(0)
+            # drain everything the driver has; block for 1 byte when idle
+            pending += ser.read(ser.in_waiting or 1)
+        except serial.SerialException as e:
+            print(f"Serial error: {e}")
+            time.sleep(0.1)
+            continue
 
-                avg = sum(buffer) / len(buffer)
-                presence_values.append(avg if avg >= PRESENCE_THRESHOLD else 0)
+        for co2, presence in read_frames(pending, FRAME):
+            co2_values.append(co2)
 
-                co2_values[:] = co2_values[-50:]
-                presence_values[:] = presence_values[-50:]
-        except:
-            pass
+            ema = presence if ema is None else ALPHA * presence + (1 - ALPHA) * ema
+            presence_values.append(ema if ema >= PRESENCE_THRESHOLD else 0)
 
 threading.Thread(target=read_serial, daemon=True).start()
 
 # ================= Stepper Function =================
 def rotate_stepper(rotations, clockwise=True):
-    GPIO.output(DIR, GPIO.HIGH if clockwise else GPIO.LOW)
+    # queues the pulse train and returns; pigpio times the steps in hardware
+    pi.write(DIR, 1 if clockwise else 0)
     steps = int(rotations * STEPS_PER_REV)
 
-    for _ in range(steps):
-        GPIO.output(STEP, GPIO.HIGH)
-        time.sleep(STEP_DELAY)
-        GPIO.output(STEP, GPIO.LOW)
-        time.sleep(STEP_DELAY)
+    chain = []
+    while steps > 0:
+        n = min(steps, 0xFFFF)   # wave_chain loop counts are 16-bit
+        chain += [255, 0, STEP_WAVE, 255, 1, n & 0xFF, n >> 8]
+        steps -= n
+    if chain:
+        pi.wave_chain(chain)
+
+stepper_q = queue.Queue(maxsize=8)
+
+def stepper_worker():
+    while True:
+        rotations, clockwise = stepper_q.get()
+        rotate_stepper(rotations, clockwise)
+        while pi.wave_tx_busy():   # let this move finish before the next one
+            time.sleep(0.01)
+
+threading.Thread(target=stepper_worker, daemon=True).start()
 
 # ================= Camera Stream =================
+def grab_frames():
+    global latest_frame
+    while True:
+        if not camera.grab():
+            time.sleep(0.1)
+            continue
+        ret, frame = camera.retrieve()
+        if ret:
+            with frame_lock:
+                latest_frame = frame
+
+threading.Thread(target=grab_frames, daemon=True).start()
+
+def is_jpeg(frame):
+    # raw MJPEG arrives as a flat uint8 buffer starting with the JPEG SOI marker
+    return frame.ndim < 3 and frame.size > 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8
+
+def encode_frames():
+    global enc_frame, enc_seq
+    last = None
+    while True:
+        with frame_lock:
+            frame = latest_frame
+        if frame is None or frame is last:
+            time.sleep(0.01)
+            continue
+        last = frame
+        if is_jpeg(frame):
+            buffer = frame.reshape(-1)   # already encoded by the camera
+        else:
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            if not ok:
+                continue
+        with enc_cv:
+            # whole multipart part built once here; clients yield it as-is
+            enc_frame = b''.join((JPEG_HDR, memoryview(buffer), PART_END))
+            enc_seq += 1
+            enc_cv.notify_all()
+
+threading.Thread(target=encode_frames, daemon=True).start()
+
 def generate_camera():
+    seen = 0
+    started = time.monotonic()
     while True:
-        ret, frame = camera.read()
-        if not ret:
+        with enc_cv:
+            # on timeout (camera stalled) re-send the last part: waitress only
+            # notices a closed client when a write fails, so this frees its thread
+            enc_cv.wait_for(lambda: enc_seq != seen, timeout=1.0)
+            seen = enc_seq
+            part = enc_frame
+        if part is None:
+            if time.monotonic() - started > 10:
+                return   # camera never delivered a frame; end the stream
             continue
-        _, buffer = cv2.imencode('.jpg', frame)
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' +
-               buffer.tobytes() + b'\r\n')
+        yield part
 
 # ================= Graphs =================
-def plot_stream(data, title, ymax):
-    fig, ax = plt.subplots(figsize=(5,2))
-    while True:
-        ax.clear()
-        ax.plot(data)
-        ax.set_ylim(0, ymax)
-        ax.set_title(title)
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        yield (b'--frame\r\nContent-Type: image/png\r\n\r\n' +
-               buf.read() + b'\r\n')
-        time.sleep(0.5)
+def make_plot(data, title, ymax):
+    # builds the figure once; each call renders one JPEG snapshot of data
+    fig = Figure(figsize=(5,2))   # not registered with pyplot, so never retained by it
+    ax = fig.subplots()
+    (line,) = ax.plot([], [])
+    ax.set_xlim(0, HISTORY - 1)
+    ax.set_ylim(0, ymax)
+    ax.set_title(title)
+    canvas = FigureCanvasAgg(fig)
+    lock = threading.Lock()   # Flask may render the same figure from two threads
+
+    def render():
+        y = data.values()
+        with lock:
+            line.set_data(np.arange(len(y)), y)
+            rgba, (w, h) = canvas.print_to_buffer()
+        img = np.frombuffer(rgba, np.uint8).reshape(h, w, 4)
+        _, jpg = cv2.imencode('.jpg', cv2.cvtColor(img, cv2.COLOR_RGBA2BGR),
+                              [cv2.IMWRITE_JPEG_QUALITY, 75])
+        return jpg.tobytes()
+
+    return render
+
+co2_plot = make_plot(co2_values, "CO2 ppm", 5000)
+presence_plot = make_plot(presence_values, "Presence", 120)
 
 # ================= Routes =================
 @app.route('/')
@@ -113,10 +247,10 @@ def index():
 <img src="/camera" width="640">
 
 <h2>CO2</h2>
-<img src="/co2">
+<img id="co2" src="/co2">
 
 <h2>Presence</h2>
-<img src="/presence">
+<img id="presence" src="/presence">
 
 <h2>Stepper Motor Control</h2>
 <form action="/rotate" method="post">
@@ -127,6 +261,15 @@ def index():
   <button name="direction" value="ccw">Rotate Anti-Clockwise</button>
 </form>
 
+<script>
+// graphs are single snapshots; re-fetch them twice a second
+setInterval(() => {
+  for (const id of ['co2', 'presence']) {
+    document.getElementById(id).src = '/' + id + '?t=' + Date.now();
+  }
+}, 500);
+</script>
+
 </body>
 </html>
 """)
@@ -135,7 +278,10 @@ def index():
 def rotate():
     rotations = float(request.form['rotations'])
     direction = request.form['direction']
-    rotate_stepper(rotations, direction == 'cw')
+    try:
+        stepper_q.put_nowait((rotations, direction == 'cw'))
+    except queue.Full:
+        return "Stepper busy, try again shortly", 409
     return redirect('/')
 
 @app.route('/camera')
@@ -145,17 +291,23 @@ def camera_feed():
 
 @app.route('/co2')
 def co2_graph():
-    return Response(plot_stream(co2_values, "CO2 ppm", 5000),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(co2_plot(), mimetype='image/jpeg',
+                    headers={'Cache-Control': 'no-store'})
 
 @app.route('/presence')
 def presence_graph():
-    return Response(plot_stream(presence_values, "Presence", 120),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(presence_plot(), mimetype='image/jpeg',
+                    headers={'Cache-Control': 'no-store'})
 
 # ================= Run =================
+# waitress serves every client from a fixed thread pool instead of Werkzeug's
+# thread-per-connection dev server. Keep it to one process: the serial, camera
+# and stepper state all live in this module.
 if __name__ == '__main__':
+    from waitress import serve
     try:
-        app.run(host='0.0.0.0', port=8080, threaded=True)
+        serve(app, host='0.0.0.0', port=8080, threads=8)
     finally:
-        GPIO.cleanup()
+        pi.wave_tx_stop()
+        pi.write(EN, 1)   # disable driver
+        pi.stop()
@@ -2,10 +2,9 @@ from flask import Flask, Response, render_template_string
 import cv2
 import serial
 import threading
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import io
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
 import time
 
 # ====== Flask App ======
@@ -16,124 +15,195 @@ ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
 time.sleep(2)  # wait for ESP32
 
 # ====== Global data ======
-co2_values = []
-distance_values = []
-presence_values = []
+class Ring:
+    # fixed-size float32 history; append overwrites the oldest sample in place.
+    # Written by the serial thread and read by graph threads, so both sides lock.
+    def __init__(self, size):
+        self.buf = np.zeros(size, dtype=np.float32)
+        self.idx = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        with self.lock:
+            self.buf[self.idx] = value
+            self.idx = (self.idx + 1) % len(self.buf)
+            self.count = min(self.count + 1, len(self.buf))
+
+    def values(self):
+        # chronological snapshot, oldest first; plot it outside the lock
+        with self.lock:
+            if self.count < len(self.buf):
+                return self.buf[:self.count].copy()
+            return np.roll(self.buf, -self.idx)
+
+HISTORY = 50  # points kept per series
+co2_values = Ring(HISTORY)
+distance_values = Ring(HISTORY)
+presence_values = Ring(HISTORY)
+
+# ====== MJPEG Part Framing ======
+JPEG_HDR = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+PART_END = b'\r\n'
 
 # ====== Camera Setup ======
-camera = cv2.VideoCapture(0)
+camera = cv2.VideoCapture(0, cv2.CAP_V4L2)
+camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
 camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
 camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # keep only the newest frame in the driver
+# If the driver really delivers MJPG, skip OpenCV's decode and hand the raw
+# JPEG through untouched (see encode_frames)
+if int(camera.get(cv2.CAP_PROP_FOURCC)) == cv2.VideoWriter_fourcc(*'MJPG'):
+    camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+# Most recent frame, published by the grabber thread
+latest_frame = None
+frame_lock = threading.Lock()
+
+# Most recent JPEG part, encoded once and shared by every /camera client
+enc_cv = threading.Condition()
+enc_frame = None
+enc_seq = 0
 
 # ====== Sensor Smoothing Parameters ======
 PRESENCE_THRESHOLD = 30   # minimum value to count as actual presence
 SMOOTH_WINDOW = 5         # number of readings for smoothing
+ALPHA = 2.0 / (SMOOTH_WINDOW + 1)  # EMA weight, same lag as a SMOOTH_WINDOW SMA
 
 # ====== Serial Reading Thread ======
+def parse_line(raw):
+    # b"co2,distance,presence" -> floats, parsed straight from bytes (no decode)
+    co2, distance, presence = raw.split(b',')  # ValueError unless exactly 3 values
+    return float(co2), float(distance), float(presence)
+
 def read_serial():
-    global co2_values, distance_values, presence_values
-    buffer = []
+    ema = None
+    pending = bytearray()
     while True:
         try:
-            line = ser.readline().decode().strip()
-            if line and ',' in line:
-                parts = line.split(',')
-                if len(parts) == 3:  # Now expecting 3 values
-                    co2, distance, presence = parts
-                    co2_values.append(float(co2))
-                    distance_values.append(float(distance))
-                    
-                    # Smooth presence detection
-                    val = float(presence)
-                    buffer.append(val)
-                    if len(buffer) > SMOOTH_WINDOW:
-                        buffer.pop(0)
-                    
-                    # rolling average
-                    avg_val = sum(buffer)/len(buffer)
-                    
-                    # threshold after smoothing
-                    presence_values.append(avg_val if avg_val >= PRESENCE_THRESHOLD else 0)
-                    
-                    # keep last 50 points
-                    co2_values = co2_values[-50:]
-                    distance_values = distance_values[-50:]
-                    presence_values = presence_values[-50:]
-            
-        except Exception as e:
+            # Read whatever the driver has buffered in one call; block for 1 byte when idle
+            pending += ser.read(ser.in_waiting or 1)
+        except serial.SerialException as e:
             print(f"Serial error: {e}")
-            pass
+            time.sleep(0.1)
+            continue
+
+        while b'\n' in pending:
+            raw, _, pending = pending.partition(b'\n')
+            if b',' not in raw:
+                continue
+            try:
+                co2, distance, presence = parse_line(raw)
+            except ValueError:
+                print(f"Bad serial line: {bytes(raw)!r}")
+                continue
+            co2_values.append(co2)
+            distance_values.append(distance)
+            
+            # Smooth presence detection (exponential moving average)
+            ema = presence if ema is None else ALPHA * presence + (1 - ALPHA) * ema
+            
+            # threshold after smoothing
+            presence_values.append(ema if ema >= PRESENCE_THRESHOLD else 0)
 
 threading.Thread(target=read_serial, daemon=True).start()
 
-# ====== Camera Frame Generator ======
-def generate_camera():
+# ====== Camera Grabber Thread ======
+def grab_frames():
+    global latest_frame
     while True:
-        success, frame = camera.read()
-        if not success:
+        if not camera.grab():
+            time.sleep(0.1)
             continue
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-# ====== Graph Generators ======
-def generate_co2_graph():
-    plt.ioff()
-    fig, ax = plt.subplots(figsize=(5,2))
-    while True:
-        ax.clear()
-        if co2_values:
-            ax.plot(co2_values, color='green')
-            ax.set_ylim(0, max(co2_values + [500]))
-        ax.set_title("CO2 Levels")
-        ax.set_ylabel("ppm")
-        ax.set_xlabel("Samples")
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        img_bytes = buf.read()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/png\r\n\r\n' + img_bytes + b'\r\n')
-        time.sleep(0.5)
-
-def generate_distance_graph():
-    plt.ioff()
-    fig, ax = plt.subplots(figsize=(5,2))
+        success, frame = camera.retrieve()
+        if success:
+            with frame_lock:
+                latest_frame = frame
+
+threading.Thread(target=grab_frames, daemon=True).start()
+
+# ====== Camera Encoder Thread ======
+def is_jpeg(frame):
+    # raw MJPEG arrives as a flat uint8 buffer starting with the JPEG SOI marker
+    return frame.ndim < 3 and frame.size > 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8
+
+def encode_frames():
+    global enc_frame, enc_seq
+    last = None
     while True:
-        ax.clear()
-        if distance_values:
-            ax.plot(distance_values, color='blue')
-            ax.set_ylim(0, max(distance_values + [10]))
-        ax.set_title("Distance Measurement")
-        ax.set_ylabel("cm")
-        ax.set_xlabel("Samples")
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        img_bytes = buf.read()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/png\r\n\r\n' + img_bytes + b'\r\n')
-        time.sleep(0.5)
-
-def generate_presence_graph():
-    plt.ioff()
-    fig, ax = plt.subplots(figsize=(5,2))
+        with frame_lock:
+            frame = latest_frame
+        # only encode frames the grabber has not handed us before
+        if frame is None or frame is last:
+            time.sleep(0.01)
+            continue
+        last = frame
+        if is_jpeg(frame):
+            buffer = frame.reshape(-1)   # already encoded by the camera
+        else:
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            if not ret:
+                continue
+        with enc_cv:
+            # whole multipart part built once here; clients yield it as-is
+            enc_frame = b''.join((JPEG_HDR, memoryview(buffer), PART_END))
+            enc_seq += 1
+            enc_cv.notify_all()
+
+threading.Thread(target=encode_frames, daemon=True).start()
+
+# ====== Camera Frame Generator ======
+def generate_camera():
+    seen = 0
+    started = time.monotonic()
     while True:
-        ax.clear()
-        if presence_values:
-            ax.plot(presence_values, color='red')
-        ax.set_ylim(0, 120)
-        ax.set_title("Presence Detection")
-        ax.set_ylabel("%")
-        ax.set_xlabel("Samples")
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        img_bytes = buf.read()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/png\r\n\r\n' + img_bytes + b'\r\n')
-        time.sleep(0.5)
+        with enc_cv:
+            # on timeout (camera stalled) re-send the last part: waitress only
+            # notices a closed client when a write fails, so this frees its thread
+            enc_cv.wait_for(lambda: enc_seq != seen, timeout=1.0)
+            seen = enc_seq
+            part = enc_frame
+        if part is None:
+            if time.monotonic() - started > 10:
+                return   # camera never delivered a frame; end the stream
+            continue
+        yield part
+
+# ====== Graph Rendering ======
+def make_graph(data, title, ylabel, color, ymax, grow=False):
+    # figure and line are built once; each call renders one JPEG snapshot
+    fig = Figure(figsize=(5,2))   # not registered with pyplot, so never retained by it
+    ax = fig.subplots()
+    (line,) = ax.plot([], [], color=color)
+    ax.set_xlim(0, HISTORY - 1)
+    ax.set_ylim(0, ymax)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("Samples")
+    canvas = FigureCanvasAgg(fig)
+    lock = threading.Lock()  # Flask may render the same figure from two threads
+
+    def render():
+        y = data.values()
+        with lock:
+            line.set_data(np.arange(len(y)), y)
+            if grow and len(y):
+                ax.set_ylim(0, max(float(y.max()), ymax))
+            rgba, (w, h) = canvas.print_to_buffer()
+        img = np.frombuffer(rgba, np.uint8).reshape(h, w, 4)
+        _, jpg = cv2.imencode('.jpg', cv2.cvtColor(img, cv2.COLOR_RGBA2BGR),
+                              [cv2.IMWRITE_JPEG_QUALITY, 75])
+        return jpg.tobytes()
+
+    return render
+
+render_co2_graph = make_graph(co2_values, "CO2 Levels", "ppm", 'green', 500, grow=True)
+render_distance_graph = make_graph(distance_values, "Distance Measurement", "cm", 'blue', 10, grow=True)
+render_presence_graph = make_graph(presence_values, "Presence Detection", "%", 'red', 120)
 
 # ====== Routes ======
 @app.route('/')
@@ -147,10 +217,18 @@ def index():
         <h2>Live Camera</h2>
         <img src="/camera" width="640"/>
         <h2>CO2 Graph</h2>
-        <img src="/co2_graph" width="640"/>
+        <img id="co2_graph" src="/co2_graph" width="640"/>
         <h2>Distance Graph</h2>
-        <img src="/distance_graph" width="640"/>
+        <img id="distance_graph" src="/distance_graph" width="640"/>
     
+        <script>
+            // Graphs are single snapshots; re-fetch them twice a second
+            setInterval(() => {
+                for (const id of ['co2_graph', 'distance_graph']) {
+                    document.getElementById(id).src = '/' + id + '?t=' + Date.now();
+                }
+            }, 500);
+        </script>
 
     </body>
     </html>
@@ -164,19 +242,23 @@ def camera_feed():
 
 @app.route('/co2_graph')
 def co2_graph_feed():
-    return Response(generate_co2_graph(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(render_co2_graph(), mimetype='image/jpeg',
+                    headers={'Cache-Control': 'no-store'})
 
 @app.route('/distance_graph')
 def distance_graph_feed():
-    return Response(generate_distance_graph(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(render_distance_graph(), mimetype='image/jpeg',
+                    headers={'Cache-Control': 'no-store'})
 
 @app.route('/presence_graph')
 def presence_graph_feed():
-    return Response(generate_presence_graph(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(render_presence_graph(), mimetype='image/jpeg',
+                    headers={'Cache-Control': 'no-store'})
 
 # ====== Run App ======
+# Serve from a fixed thread pool instead of Werkzeug's dev server. Use a single
+# process only, since serial and camera state is module-global, e.g.
+#   gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:8080 test:app
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, threaded=True)
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=8080, threads=8)
@@ -1,25 +1,37 @@
-from flask import Flask, render_template, Response, jsonify
+from flask import Flask, render_template, Response, request
 import serial
 import threading
 import cv2
 import time
-import io
 import math
-from collections import deque
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import gzip
+import struct
+import importlib.util
+import os
 import numpy as np
+import orjson
 from scipy import stats
 
 # ===== Configuration =====
 SERIAL_PORT = '/dev/ttyUSB0'
 BAUD_RATE = 115200
 CAMERA_INDEX = 0
+JPEG_QUALITY = 80  # encoded once per captured frame, shared by all clients
+OVERLAY_HEIGHT = 120  # rows of the frame darkened behind the sensor text
+
+# One encoder thread is plenty at 640x480; avoids oversubscribing the Pi's
+# cores next to Flask's request threads
+cv2.setNumThreads(1)
 
 # ===== Distance Estimation Parameters =====
 DISTANCE_SMOOTHING_WINDOW = 5  # Number of samples for moving average
 MIN_CONFIDENCE_THRESHOLD = 0.6  # Minimum confidence to show distance
+DISTANCE_EWMA_LAMBDA = 0.85  # Weight kept by the previous estimate per sample
+DISTANCE_OUTLIER_K = 3.0  # Reject samples more than K std devs from the estimate
+DISTANCE_OUTLIER_K2 = DISTANCE_OUTLIER_K ** 2  # Compared against variance, no sqrt
+
+# Columns of the per-sample history ring (struct-of-arrays)
+CO2_COL, PRESENCE_COL = 0, 1
 
 # ===== Flask App =====
 app = Flask(__name__)
@@ -28,81 +40,104 @@ app = Flask(__name__)
 class SensorData:
     def __init__(self, max_history=100):
         self.max_history = max_history
-        self.co2_values = deque(maxlen=max_history)
-        self.presence_values = deque(maxlen=max_history)
-        self.distance_values = deque(maxlen=50)  # Valid distances only
-        self.raw_distances = deque(maxlen=20)    # Raw distances for filtering
+        # One row per serial sample; co2 and presence are small integers,
+        # exact in float32
+        self.samples = np.zeros((max_history, 2), np.float32)
+        self.sample_idx = 0
+        self.sample_count = 0
+        # Valid distances only; float64 so the 2-dp values stay exact in JSON
+        self.distances = np.zeros(50, np.float64)
+        self.distance_idx = 0
+        self.distance_count = 0
+        self.distance_sum = 0.0    # Running sums over the distance ring
+        self.distance_sumsq = 0.0
+        self.ewma_distance = None  # Filtered distance estimate
+        self.ewma_variance = 0.0   # Running spread around the estimate
+        self.filter_samples = 0
         self.human_present = False
         self.current_distance = 0
         self.distance_confidence = 0
-        self.last_human_time = 0
+        self.last_human_time = 0  # time.monotonic() of the last detection
         self.human_timeout = 3  # seconds
         self.last_update = time.time()
+        # Serial thread writes, Flask and camera threads read; the compound
+        # updates below must not be seen half-done
+        self.lock = threading.Lock()
         
-    def update_from_serial(self, co2_ppm, presence, distance_str):
+    def update_from_serial(self, co2_ppm, presence, distance):
         """Update from ESP32 serial data"""
-        self.co2_values.append(co2_ppm)
-        self.presence_values.append(presence)
-        
-        try:
-            distance = float(distance_str)
-            
-            # Store raw distance
-            self.raw_distances.append(distance)
+        now = time.monotonic()  # timeouts only; immune to wall-clock jumps
+        with self.lock:
+            self.samples[self.sample_idx] = (co2_ppm, presence)
+            self.sample_idx = (self.sample_idx + 1) % self.max_history
+            self.sample_count = min(self.sample_count + 1, self.max_history)
             
             # Only process if presence detected
             if presence == 1 and distance > 0.1:
                 self.human_present = True
-                self.last_human_time = time.time()
-                
+                self.last_human_time = now
+            
                 # Apply moving average filter
-                filtered_distance = self.apply_distance_filter()
-                
+                filtered_distance = self.apply_distance_filter(distance)
+            
                 if filtered_distance > 0:
                     self.current_distance = filtered_distance
-                    self.distance_values.append(filtered_distance)
+                    self.add_distance(filtered_distance)
                     self.calculate_confidence()
             else:
                 # Check timeout
-                if time.time() - self.last_human_time > self.human_timeout:
+                if now - self.last_human_time > self.human_timeout:
                     self.human_present = False
                     self.current_distance = 0
                     self.distance_confidence = 0
-                    
-        except ValueError:
-            pass
+                    self.ewma_distance = None  # Next person starts fresh
+                    self.ewma_variance = 0.0
+                    self.filter_samples = 0
             
-        self.last_update = time.time()
+            self.last_update = time.time()  # wall clock, reported in /data
         
-    def apply_distance_filter(self):
-        """Apply moving average and outlier rejection"""
-        if len(self.raw_distances) < 3:
-            return 0
-            
-        # Convert to list for processing
-        distances = list(self.raw_distances)
-        
-        # Remove outliers using IQR method
-        q1 = np.percentile(distances, 25)
-        q3 = np.percentile(distances, 75)
-        iqr = q3 - q1
-        lower_bound = q1 - 1.5 * iqr
-        upper_bound = q3 + 1.5 * iqr
+    def apply_distance_filter(self, distance):
+        """Exponentially weighted average with outlier rejection"""
+        self.filter_samples += 1
+        lam = DISTANCE_EWMA_LAMBDA
+        var = self.ewma_variance
         
-        filtered = [d for d in distances if lower_bound <= d <= upper_bound]
+        if self.ewma_distance is None:
+            self.ewma_distance = distance
+        else:
+            deviation = distance - self.ewma_distance
+            
+            # Hampel-style reject: skip samples far outside the running spread,
+            # but still widen the spread so a real move is accepted soon after
+            if var > 0 and deviation * deviation > DISTANCE_OUTLIER_K2 * var:
+                self.ewma_variance = lam * var + (1 - lam) * deviation * deviation
+            else:
+                # Same update as lam*old + (1-lam)*new, one multiply fewer
+                self.ewma_distance += (1 - lam) * deviation
+                residual = distance - self.ewma_distance
+                self.ewma_variance = lam * var + (1 - lam) * residual * residual
         
-        if not filtered:
+        if self.filter_samples < 3:
             return 0
             
-        # Apply weighted moving average (recent samples have more weight)
-        weights = list(range(1, len(filtered) + 1))
-        weighted_avg = sum(d * w for d, w in zip(filtered, weights)) / sum(weights)
+        return round(self.ewma_distance, 2)  # Round to 2 decimal places
         
-        return round(weighted_avg, 2)  # Round to 2 decimal places
+    def add_distance(self, distance):
+        """Append a filtered distance, keeping the running sums in step"""
+        size = len(self.distances)
+        if self.distance_count == size:
+            oldest = self.distances[self.distance_idx]  # slot about to be overwritten
+            self.distance_sum -= oldest
+            self.distance_sumsq -= oldest * oldest
+        self.distances[self.distance_idx] = distance
+        self.distance_idx = (self.distance_idx + 1) % size
+        self.distance_count = min(self.distance_count + 1, size)
+        self.distance_sum += distance
+        self.distance_sumsq += distance * distance
         
     def calculate_confidence(self):
         """Calculate confidence level for distance measurement"""
-        if len(self.distance_values) < 3:
+        if self.distance_count < 3:
             self.distance_confidence = 0.3
             return
             
@@ -111,17 +146,18 @@ class SensorData:
         # 2. Number of consecutive detections
         # 3. Signal-to-noise ratio
         
-        distances = list(self.distance_values)
+        n = self.distance_count
         
         # Calculate standard deviation (lower = more confident)
-        if len(distances) > 1:
-            std_dev = np.std(distances)
+        if n > 1:
+            mean = self.distance_sum / n
+            std_dev = math.sqrt(max(0.0, self.distance_sumsq / n - mean * mean))
             consistency = max(0, 1 - (std_dev / 2))  # Normalize
         else:
             consistency = 0.5
             
         # Recent activity bonus
-        recency_bonus = min(1.0, len(self.distance_values) / 10)
+        recency_bonus = min(1.0, self.distance_count / 10)
         
         # Combined confidence
         self.distance_confidence = min(0.95, 0.7 * consistency + 0.3 * recency_bonus)
@@ -142,60 +178,105 @@ class SensorData:
         else:
             return f"FAR ({dist}m)"
             
+    @staticmethod
+    def ordered(ring, idx, count):
+        """Ring contents oldest first (a view until the ring has wrapped)"""
+        if count < len(ring):
+            return ring[:count]
+        return np.concatenate((ring[idx:], ring[:idx]))
+        
+    def series(self, col):
+        """One column of the sample history, oldest first"""
+        return self.ordered(self.samples, self.sample_idx, self.sample_count)[:, col]
+        
+    def distance_series(self):
+        return self.ordered(self.distances, self.distance_idx, self.distance_count)
+        
+    def has_valid_distance(self):
+        return (self.human_present and 
+                self.current_distance > 0 and 
+                self.distance_confidence > MIN_CONFIDENCE_THRESHOLD)
+        
+    def get_overlay_snapshot(self):
+        """Scalars needed by the camera overlay, without copying the histories"""
+        with self.lock:
+            return (self.human_present, self.current_distance,
+                    self.distance_confidence, self.get_distance_category(),
+                    self.has_valid_distance())
+        
     def get_data(self):
-        has_valid_distance = (self.human_present and 
-                             self.current_distance > 0 and 
-                             self.distance_confidence > MIN_CONFIDENCE_THRESHOLD)
+        with self.lock:
+            has_valid_distance = self.has_valid_distance()
         
-        return {
-            "co2": list(self.co2_values),
-            "presence": list(self.presence_values),
-            "distance_values": list(self.distance_values) if has_valid_distance else [],
-            "human": 1 if self.human_present else 0,
-            "distance": self.current_distance,
-            "distance_meters": self.current_distance,
-            "distance_cm": self.current_distance * 100,
-            "distance_category": self.get_distance_category(),
-            "confidence": round(self.distance_confidence, 2),
-            "co2_current": self.co2_values[-1] if self.co2_values else 0,
-            "status": "HUMAN PRESENT" if self.human_present else "NO HUMAN",
-            "has_distance_data": has_valid_distance,
-            "timestamp": self.last_update,
-            "detection_count": len(self.distance_values)
-        }
+            return {
+                # Copied under the lock; _json() serializes the arrays directly
+                "co2": self.series(CO2_COL).copy(),
+                "presence": self.series(PRESENCE_COL).copy(),
+                "distance_values": self.distance_series().copy() if has_valid_distance else [],
+                "human": 1 if self.human_present else 0,
+                "distance": self.current_distance,
+                "distance_meters": self.current_distance,
+                "distance_cm": self.current_distance * 100,
+                "distance_category": self.get_distance_category(),
+                "confidence": round(self.distance_confidence, 2),
+                "co2_current": int(self.samples[self.sample_idx - 1, CO2_COL]) if self.sample_count else 0,
+                "status": "HUMAN PRESENT" if self.human_present else "NO HUMAN",
+                "has_distance_data": has_valid_distance,
+                "timestamp": self.last_update,
+                "detection_count": self.distance_count
+            }
 
 sensor_data = SensorData()
 
 # ===== Serial Communication =====
+# Binary frame sent by src/co2+distance.cpp (9 bytes, little-endian):
+#   0xAA | uint16 co2 ppm | uint8 presence | float32 distance m | CRC-8 of the 7 payload bytes
+FRAME = struct.Struct('<HBf')
+
+# Sync, CRC and resync come from the one parser shared with the
+# broadcast/SIH2025 dashboards; loaded by path, as that folder is not a package
+_spec = importlib.util.spec_from_file_location(
+    "serial_frame", os.path.join(os.path.dirname(os.path.abspath(__file__)), "SIH2025", "serial_frame.py"))
+serial_frame = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(serial_frame)
+
 def serial_reader():
     """Read data from ESP32 with distance"""
     try:
         ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
         time.sleep(2)  # Wait for ESP32
         print(f"Connected to ESP32 on {SERIAL_PORT}")
-        print("Waiting for sensor data (CO2,Presence,Distance,Status)...")
+        print("Waiting for sensor frames (CO2, Presence, Distance)...")
         
+        pending = bytearray()
+        unframed = 0  # bytes received since the last valid frame
         while True:
             try:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line and ',' in line:
-                    parts = line.split(',')
-                    if len(parts) >= 4:
-                        co2_ppm = int(parts[0])
-                        presence = 1 if parts[1] == '1' else 0
-                        distance_str = parts[2]
-                        status = parts[3]
-                        
-                        sensor_data.update_from_serial(co2_ppm, presence, distance_str)
-                        
-                        # Debug output
-                        if presence == 1 and distance_str != '0.0':
-                            print(f"[RADAR] Distance: {distance_str}m | Confidence: {sensor_data.distance_confidence:.2f}")
-                            
-            except (ValueError, IndexError) as e:
-                continue
-            except Exception as e:
+                # Drain whatever the driver has buffered in one call (block for
+                # 1 byte when idle)
+                chunk = ser.read(ser.in_waiting or 1)
+            except serial.SerialException as e:
                 print(f"Serial error: {e}")
+                time.sleep(0.1)  # adapter unplugged; don't spin
+                continue
+            pending += chunk
+            
+            frames = serial_frame.read_frames(pending, FRAME)
+            if frames:
+                unframed = 0
+            elif unframed < 256 <= unframed + len(chunk):
+                # e.g. an ESP32 still running the old CSV sketch
+                print("No valid sensor frames received; is src/co2+distance.cpp flashed?")
+            if not frames:
+                unframed += len(chunk)
+                
+            for co2_ppm, presence, distance in frames:
+                presence = 1 if presence else 0
+                sensor_data.update_from_serial(co2_ppm, presence, distance)
+                
+                # Debug output
+                if presence == 1 and distance != 0.0:
+                    print(f"[RADAR] Distance: {distance:.2f}m | Confidence: {sensor_data.distance_confidence:.2f}")
                 
     except serial.SerialException as e:
         print(f"Serial connection error: {e}")
@@ -206,197 +287,151 @@ class CameraStream:
         self.camera = cv2.VideoCapture(camera_index)
         self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # read() returns the newest frame
         self.frame = None
+        self.frame_jpeg = None  # latest encoded frame (bytes)
+        self.lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.lock)
+        self.frame_seq = 0  # bumped for every new frame_jpeg
+        self.ts_second = None  # overlay timestamp, re-formatted once per second
+        self.ts_text = ''
+        self.subscribers = 0  # open /video_feed streams; capture parks at zero
+        self.sub_cv = threading.Condition()
+        self.band_black = None      # cached per frame width, see overlay_template()
+        self.label_template = None
+        self.label_mask = None
         self.running = True
         self.thread = threading.Thread(target=self.update_frame)
         self.thread.daemon = True
         self.thread.start()
         
     def update_frame(self):
+        # camera.read() blocks until the driver has the next frame, so the
+        # loop runs at the camera's own rate with no extra sleep
         while self.running:
+            # Nobody watching: sleep until a /video_feed client subscribes
+            with self.sub_cv:
+                self.sub_cv.wait_for(lambda: self.subscribers > 0 or not self.running)
             success, frame = self.camera.read()
-            if success:
-                # Get current sensor data
-                data = sensor_data.get_data()
-                
-                # Add overlay with distance information
-                self.add_sensor_overlay(frame, data)
-                self.frame = frame
-            time.sleep(0.033)  # ~30 FPS
-    
-    def add_sensor_overlay(self, frame, data):
-        """Add sensor information overlay to frame"""
+            if not success:
+                time.sleep(0.1)  # camera unplugged or busy; don't spin
+                continue
+            # Get current sensor data
+            snapshot = sensor_data.get_overlay_snapshot()
+            
+            # Add overlay with distance information
+            self.add_sensor_overlay(frame, snapshot)
+            
+            # Encode once here instead of once per client in get_frame()
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if ok:
+                with self.frame_ready:
+                    self.frame = frame
+                    self.frame_jpeg = buffer.tobytes()
+                    self.frame_seq += 1
+                    self.frame_ready.notify_all()
+
+    def timestamp(self):
+        """Overlay timestamp, formatted only when the second changes"""
+        now = int(time.time())
+        if now != self.ts_second:
+            self.ts_second = now
+            self.ts_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        return self.ts_text
+        
+    def overlay_template(self, width):
+        """Build the black band and fixed label pixels once per frame width"""
+        if self.band_black is None or self.band_black.shape[1] != width:
+            self.band_black = np.zeros((OVERLAY_HEIGHT, width, 3), np.uint8)
+            labels = np.zeros_like(self.band_black)
+            cv2.rectangle(labels, (width - 120, 30), (width - 20, 50), (255, 255, 255), 1)
+            cv2.putText(labels, "Confidence", (width - 120, 25), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            self.label_template = labels
+            self.label_mask = labels.any(axis=2)
+        
+    def add_sensor_overlay(self, frame, snapshot):
+        """Add sensor information overlay to frame (in place)"""
+        human, distance, confidence, category, has_distance = snapshot
         height, width = frame.shape[:2]
+        self.overlay_template(width)
         
-        # Background for text (semi-transparent)
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (width, 120), (0, 0, 0), -1)
-        frame = cv2.addWeighted(overlay, 0.5, frame, 0.5, 0)
+        # Background for text (semi-transparent), blended on the top rows only
+        band = frame[:OVERLAY_HEIGHT]
+        cv2.addWeighted(band, 0.5, self.band_black[:band.shape[0]], 0.5, 0, dst=band)
         
         # Timestamp
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = self.timestamp()
         cv2.putText(frame, timestamp, (10, 30), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         
         # Status with color coding
-        status_color = (0, 255, 0) if data['human'] else (0, 0, 255)
-        cv2.putText(frame, f"Status: {data['status']}", (10, 60), 
+        status_color = (0, 255, 0) if human else (0, 0, 255)
+        status = "HUMAN PRESENT" if human else "NO HUMAN"
+        cv2.putText(frame, f"Status: {status}", (10, 60), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
         
         # Distance information (if available)
-        if data['has_distance_data']:
+        if has_distance:
             # Distance in meters and cm
-            dist_text = f"Distance: {data['distance_meters']:.2f}m ({data['distance_cm']:.0f}cm)"
+            dist_text = f"Distance: {distance:.2f}m ({distance * 100:.0f}cm)"
             cv2.putText(frame, dist_text, (10, 90), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
             
             # Confidence indicator
-            conf_text = f"Confidence: {data['confidence']*100:.0f}%"
-            conf_color = (0, 255, 0) if data['confidence'] > 0.7 else (0, 165, 255) if data['confidence'] > 0.4 else (0, 0, 255)
+            confidence = round(confidence, 2)
+            conf_text = f"Confidence: {confidence*100:.0f}%"
+            conf_color = (0, 255, 0) if confidence > 0.7 else (0, 165, 255) if confidence > 0.4 else (0, 0, 255)
             cv2.putText(frame, conf_text, (10, 120), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, conf_color, 2)
             
-            # Visual distance indicator (bar)
-            bar_width = int(data['confidence'] * 100)
+            # Visual distance indicator (bar), then the prebuilt outline and caption
+            bar_width = int(confidence * 100)
             cv2.rectangle(frame, (width - 120, 30), (width - 120 + bar_width, 50), conf_color, -1)
-            cv2.rectangle(frame, (width - 120, 30), (width - 20, 50), (255, 255, 255), 1)
-            cv2.putText(frame, "Confidence", (width - 120, 25), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            n = band.shape[0]
+            np.copyto(band, self.label_template[:n], where=self.label_mask[:n, :, None])
                        
             # Distance category
-            cv2.putText(frame, f"Category: {data['distance_category']}", (width - 200, 80), 
+            cv2.putText(frame, f"Category: {category}", (width - 200, 80), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 200, 0), 1)
         
         return frame
             
     def get_frame(self):
-        if self.frame is None:
-            return None
-        _, buffer = cv2.imencode('.jpg', self.frame)
-        return buffer.tobytes()
+        """Latest JPEG bytes, or None before the first frame"""
+        with self.lock:
+            return self.frame_jpeg
+            
+    def subscribe(self):
+        with self.sub_cv:
+            self.subscribers += 1
+            self.sub_cv.notify_all()
+            
+    def unsubscribe(self):
+        with self.sub_cv:
+            self.subscribers -= 1
+            
+    def wait_frame(self, seen, timeout=1.0):
+        """Wait up to `timeout` s for a frame newer than seq `seen`; return (seq, jpeg).
+        On timeout the last frame comes back unchanged (None before the first)"""
+        with self.frame_ready:
+            self.frame_ready.wait_for(lambda: self.frame_seq != seen, timeout)
+            return self.frame_seq, self.frame_jpeg
         
     def stop(self):
         self.running = False
+        with self.sub_cv:
+            self.sub_cv.notify_all()
         self.camera.release()
 
 camera = CameraStream(CAMERA_INDEX)
 
-# ===== Enhanced Graph Generation =====
-def generate_distance_graph():
-    """Generate enhanced distance graph with confidence bands"""
-    plt.ioff()
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), 
-                                   gridspec_kw={'height_ratios': [3, 1]})
-    
-    data = sensor_data.get_data()
-    distances = data['distance_values']
-    
-    if distances and data['has_distance_data']:
-        # Main distance plot
-        x_vals = list(range(len(distances)))
-        ax1.plot(x_vals, distances, color='purple', linewidth=3, marker='o', markersize=6)
-        
-        # Add confidence band
-        if len(distances) > 1:
-            mean_dist = np.mean(distances)
-            std_dist = np.std(distances)
-            ax1.fill_between(x_vals, 
-                           [d - std_dist*data['confidence'] for d in distances],
-                           [d + std_dist*data['confidence'] for d in distances],
-                           alpha=0.2, color='purple', label='Confidence Band')
-        
-        # Current distance line
-        current_dist = data['distance']
-        ax1.axhline(y=current_dist, color='red', linestyle='--', alpha=0.7, 
-                   label=f'Current: {current_dist:.2f}m')
-        
-        # Zone indicators
-        ax1.axhspan(0, 1, alpha=0.1, color='red', label='Very Close (0-1m)')
-        ax1.axhspan(1, 2, alpha=0.1, color='orange', label='Close (1-2m)')
-        ax1.axhspan(2, 4, alpha=0.1, color='yellow', label='Medium (2-4m)')
-        ax1.axhspan(4, 6, alpha=0.1, color='green', label='Far (4-6m)')
-        
-        ax1.set_ylim(0, 6)
-        ax1.set_ylabel('Distance (m)', fontsize=12)
-        ax1.set_title(f'Human Distance: {current_dist:.2f}m | Confidence: {data["confidence"]*100:.0f}%', 
-                     fontsize=14, fontweight='bold')
-        ax1.legend(loc='upper right', fontsize=8)
-        ax1.grid(True, alpha=0.3)
-        
-        # Confidence plot
-        confidence_vals = [data['confidence']] * len(distances)
-        ax2.plot(x_vals, confidence_vals, color='blue', linewidth=2)
-        ax2.fill_between(x_vals, confidence_vals, alpha=0.3, color='blue')
-        ax2.set_ylim(0, 1)
-        ax2.set_ylabel('Confidence', fontsize=12)
-        ax2.set_xlabel('Time (samples)', fontsize=12)
-        ax2.grid(True, alpha=0.3)
-        
-        # Add confidence thresholds
-        ax2.axhline(y=0.7, color='green', linestyle=':', alpha=0.5, label='High Conf')
-        ax2.axhline(y=0.4, color='orange', linestyle=':', alpha=0.5, label='Medium Conf')
-        
-    else:
-        # No human detected
-        for ax in [ax1, ax2]:
-            ax.text(0.5, 0.5, 'Waiting for human detection...\nRadar will show distance when human is detected', 
-                    horizontalalignment='center', verticalalignment='center',
-                    transform=ax.transAxes, fontsize=12, color='gray')
-            ax.set_ylim(0, 1)
-            ax.set_xlim(0, 10)
-            ax.set_xticks([])
-            ax.set_yticks([])
-        
-        ax1.set_title('Distance Tracking - Standby Mode', fontsize=14)
-    
-    plt.tight_layout()
-    
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.read()
-
-def generate_co2_graph():
-    """Generate CO2 graph"""
-    plt.ioff()
-    fig, ax = plt.subplots(figsize=(8, 4))
-    
-    co2_values = sensor_data.co2_values
-    if co2_values:
-        ax.plot(list(co2_values), color='green', linewidth=2)
-        ax.fill_between(range(len(co2_values)), list(co2_values), alpha=0.3, color='green')
-        
-        # Add current value
-        current = co2_values[-1] if co2_values else 0
-        ax.annotate(f'Current: {current} ppm', 
-                   xy=(len(co2_values)-1, current),
-                   xytext=(10, 10), textcoords='offset points',
-                   bbox=dict(boxstyle="round,pad=0.3", fc="yellow", alpha=0.8))
-        
-        # Safe level indicator (1000 ppm)
-        ax.axhline(y=1000, color='red', linestyle='--', alpha=0.5, label='Safe Limit')
-        
-        ax.set_ylim(400, max(co2_values + [2000]))
-        ax.set_title('CO2 Concentration', fontsize=14, fontweight='bold')
-        ax.set_ylabel('CO2 (ppm)', fontsize=12)
-        ax.legend()
-    else:
-        ax.text(0.5, 0.5, 'No CO2 data', 
-                horizontalalignment='center', verticalalignment='center',
-                transform=ax.transAxes, fontsize=14, color='gray')
-        ax.set_ylim(0, 2000)
-    
-    ax.set_xlabel('Time (samples)', fontsize=12)
-    ax.grid(True, alpha=0.3)
-    
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.read()
-
 # ===== Flask Routes =====
+def _json(obj):
+    """JSON response via orjson (handles numpy arrays without tolist())"""
+    return Response(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+                    mimetype='application/json')
+
 @app.route('/')
 def index():
     """Serve main dashboard"""
@@ -405,39 +440,54 @@ def index():
 @app.route('/data')
 def get_sensor_data():
     """JSON endpoint for sensor data"""
-    return jsonify(sensor_data.get_data())
+    return _json(sensor_data.get_data())
 
 @app.route('/video_feed')
 def video_feed():
     """Video streaming route"""
     def generate():
-        while True:
-            frame_bytes = camera.get_frame()
-            if frame_bytes:
+        # Keeps the capture thread running only while someone is watching;
+        # the finally runs when the client disconnects and the server
+        # closes this generator
+        camera.subscribe()
+        started = time.monotonic()
+        try:
+            seen = camera.frame_seq
+            while True:
+                # Woken by the capture thread, so each frame is sent once. If
+                # the camera stalls the last frame is re-sent every second:
+                # a closed tab is only noticed when a write fails
+                seen, frame_bytes = camera.wait_frame(seen, timeout=1.0)
+                if frame_bytes is None:
+                    if time.monotonic() - started > 10:
+                        return   # camera never delivered a frame; end the stream
+                    continue
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.033)
+        finally:
+            camera.unsubscribe()
     
     return Response(generate(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+                    mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-cache, private'})
 
+# Graphs are drawn in the browser from /data (see /dashboard); the old
+# server-rendered PNG endpoints only tell stale clients where they went.
 @app.route('/distance_graph')
 def distance_graph():
-    """Distance graph image"""
-    graph_bytes = generate_distance_graph()
-    return Response(graph_bytes, mimetype='image/png')
+    """Removed: distance graph is drawn client-side from /data"""
+    return Response("Gone: draw the distance graph from /data", status=410, mimetype='text/plain')
 
 @app.route('/co2_graph')
 def co2_graph():
-    """CO2 graph image"""
-    graph_bytes = generate_co2_graph()
-    return Response(graph_bytes, mimetype='image/png')
+    """Removed: CO2 graph is drawn client-side from /data"""
+    return Response("Gone: draw the CO2 graph from /data", status=410, mimetype='text/plain')
 
 @app.route('/api/status')
 def api_status():
     """API endpoint for system status"""
     data = sensor_data.get_data()
-    return jsonify({
+    return _json({
         "system": "online",
         "human_detected": data['human'],
         "distance_meters": data['distance_meters'],
@@ -449,16 +499,17 @@ def api_status():
     })
 
 # ===== HTML Template =====
-@app.route('/dashboard')
-def dashboard():
-    """Complete dashboard page"""
-    html_template = '''
+# Static page (no per-request substitutions): encoded and gzipped once at import
+DASHBOARD_HTML = '''
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Radar Distance Monitor</title>
+        <!-- Chart.js 4.4.1 served from broadcast/static/; pinned CDN copy if it is missing -->
+        <script src="/static/chart.umd.min.js"></script>
+        <script>window.Chart || document.write('<script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"><\\/script>')</script>
         <style>
             * {
                 margin: 0;
@@ -616,8 +667,9 @@ def dashboard():
                 text-align: center;
             }
             
-            .graph-container img {
+            .graph-container canvas {
                 width: 100%;
+                background: rgba(255, 255, 255, 0.95);
                 border-radius: 15px;
                 border: 1px solid rgba(255, 255, 255, 0.2);
             }
@@ -736,7 +788,8 @@ def dashboard():
                 <div class="card">
                     <h2>📈 Distance Tracking Graph</h2>
                     <div class="graph-container">
-                        <img id="distanceGraph" src="/distance_graph" alt="Distance Graph">
+                        <canvas id="distChart" height="240"></canvas>
+                        <canvas id="confChart" height="100"></canvas>
                     </div>
                 </div>
                 
@@ -744,7 +797,7 @@ def dashboard():
                 <div class="card">
                     <h2>🌫️ CO2 Levels</h2>
                     <div class="graph-container">
-                        <img id="co2Graph" src="/co2_graph" alt="CO2 Graph">
+                        <canvas id="co2Chart" height="160"></canvas>
                     </div>
                 </div>
                 
@@ -783,17 +836,136 @@ def dashboard():
             let detectionHistory = [];
             let startTime = Date.now();
             
-            function updateDashboard() {
-                // Auto-refresh images with timestamp to prevent caching
-                const timestamp = new Date().getTime();
-                document.getElementById('distanceGraph').src = '/distance_graph?' + timestamp;
-                document.getElementById('co2Graph').src = '/co2_graph?' + timestamp;
-                document.getElementById('cameraFeed').src = '/video_feed?' + timestamp;
+            // Charts are built once and only have their data swapped on each
+            // /data poll. The camera feed is a live MJPEG stream; its src is
+            // never touched, which would reopen the connection.
+            // Without Chart.js (offline, no vendored copy) the graphs stay
+            // empty but the status boxes below keep updating.
+            const hasChart = typeof Chart !== 'undefined';
+            
+            // Distance zones drawn as filled bands behind the distance line
+            const ZONES = [
+                { label: 'Very Close (0-1m)', from: 0, to: 1, color: 'rgba(255, 0, 0, 0.1)' },
+                { label: 'Close (1-2m)', from: 1, to: 2, color: 'rgba(255, 165, 0, 0.1)' },
+                { label: 'Medium (2-4m)', from: 2, to: 4, color: 'rgba(255, 255, 0, 0.1)' },
+                { label: 'Far (4-6m)', from: 4, to: 6, color: 'rgba(0, 128, 0, 0.1)' }
+            ];
+            const zoneDatasets = ZONES.map(z => ({
+                label: z.label, data: [], zone: z, borderWidth: 0, pointRadius: 0,
+                fill: { value: z.from }, backgroundColor: z.color
+            }));
+            
+            const distChart = hasChart ? new Chart(document.getElementById('distChart'), {
+                type: 'line',
+                data: {
+                    labels: [],
+                    datasets: [
+                        { label: 'Distance (m)', data: [], borderColor: 'purple', borderWidth: 3, pointRadius: 3 },
+                        { label: 'Confidence Band', data: [], borderWidth: 0, pointRadius: 0, fill: false },
+                        { label: 'Confidence Band', data: [], borderWidth: 0, pointRadius: 0, fill: '-1',
+                          backgroundColor: 'rgba(128, 0, 128, 0.2)' },
+                        { label: 'Current', data: [], borderColor: 'rgba(255, 0, 0, 0.7)', borderDash: [6, 4],
+                          borderWidth: 2, pointRadius: 0 },
+                        ...zoneDatasets
+                    ]
+                },
+                options: {
+                    animation: false,
+                    scales: {
+                        x: { title: { display: true, text: 'Time (samples)' } },
+                        y: { min: 0, max: 6, title: { display: true, text: 'Distance (m)' } }
+                    },
+                    plugins: {
+                        title: { display: true, text: 'Distance Tracking - Standby Mode' },
+                        legend: { labels: { filter: item => item.datasetIndex !== 1 } }
+                    }
+                }
+            }) : null;
+            
+            const confChart = hasChart ? new Chart(document.getElementById('confChart'), {
+                type: 'line',
+                data: {
+                    labels: [],
+                    datasets: [
+                        { label: 'Confidence', data: [], borderColor: 'blue', borderWidth: 2, pointRadius: 0,
+                          fill: 'origin', backgroundColor: 'rgba(0, 0, 255, 0.3)' },
+                        { label: 'High Conf', data: [], borderColor: 'rgba(0, 128, 0, 0.5)', borderDash: [2, 3],
+                          borderWidth: 1, pointRadius: 0 },
+                        { label: 'Medium Conf', data: [], borderColor: 'rgba(255, 165, 0, 0.5)', borderDash: [2, 3],
+                          borderWidth: 1, pointRadius: 0 }
+                    ]
+                },
+                options: {
+                    animation: false,
+                    scales: {
+                        x: { title: { display: true, text: 'Time (samples)' } },
+                        y: { min: 0, max: 1, title: { display: true, text: 'Confidence' } }
+                    }
+                }
+            }) : null;
+            
+            const co2Chart = hasChart ? new Chart(document.getElementById('co2Chart'), {
+                type: 'line',
+                data: {
+                    labels: [],
+                    datasets: [
+                        { label: 'CO2 (ppm)', data: [], borderColor: 'green', borderWidth: 2, pointRadius: 0,
+                          fill: true, backgroundColor: 'rgba(0, 128, 0, 0.3)' },
+                        { label: 'Safe Limit', data: [], borderColor: 'red', borderDash: [6, 4], borderWidth: 1, pointRadius: 0 }
+                    ]
+                },
+                options: {
+                    animation: false,
+                    scales: {
+                        x: { title: { display: true, text: 'Time (samples)' } },
+                        y: { suggestedMin: 400, suggestedMax: 2000, title: { display: true, text: 'CO2 (ppm)' } }
+                    },
+                    plugins: { title: { display: true, text: 'CO2 Concentration' } }
+                }
+            }) : null;
+            
+            function updateCharts(data) {
+                if (!hasChart) return;
+                // Standby: no human in range, so the distance graphs are cleared
+                const distances = data.has_distance_data ? data.distance_values : [];
+                const labels = distances.map((_, i) => i);
+                const ds = distChart.data.datasets;
+                distChart.data.labels = labels;
+                ds[0].data = distances;
+                
+                // Band of +/- one std dev, scaled by confidence
+                const mean = distances.reduce((a, b) => a + b, 0) / (distances.length || 1);
+                const std = Math.sqrt(distances.reduce((a, b) => a + (b - mean) ** 2, 0) / (distances.length || 1));
+                const spread = std * data.confidence;
+                ds[1].data = distances.length > 1 ? distances.map(d => d - spread) : [];
+                ds[2].data = distances.length > 1 ? distances.map(d => d + spread) : [];
+                ds[3].data = distances.map(() => data.distance);
+                ds[3].label = `Current: ${data.distance.toFixed(2)}m`;
+                for (const z of ds.slice(4)) z.data = distances.map(() => z.zone.to);
+                distChart.options.plugins.title.text = data.has_distance_data
+                    ? `Human Distance: ${data.distance.toFixed(2)}m | Confidence: ${Math.round(data.confidence * 100)}%`
+                    : 'Distance Tracking - Standby Mode';
+                distChart.update('none');
+                
+                confChart.data.labels = labels;
+                confChart.data.datasets[0].data = distances.map(() => data.confidence);
+                confChart.data.datasets[1].data = distances.map(() => 0.7);
+                confChart.data.datasets[2].data = distances.map(() => 0.4);
+                confChart.update('none');
                 
+                co2Chart.data.labels = data.co2.map((_, i) => i);
+                co2Chart.data.datasets[0].data = data.co2;
+                co2Chart.data.datasets[1].data = data.co2.map(() => 1000);
+                co2Chart.update('none');
+            }
+            
+            function updateDashboard() {
                 // Fetch sensor data
                 fetch('/data')
                     .then(response => response.json())
                     .then(data => {
+                        updateCharts(data);
+                        
                         // Update status
                         const statusBox = document.getElementById('statusBox');
                         const statusText = document.getElementById('statusText');
@@ -911,7 +1083,17 @@ def dashboard():
     </body>
     </html>
     '''
-    return html_template
+DASHBOARD_BYTES = DASHBOARD_HTML.encode('utf-8')
+DASHBOARD_GZ = gzip.compress(DASHBOARD_BYTES, 9)
+
+@app.route('/dashboard')
+def dashboard():
+    """Complete dashboard page"""
+    headers = {'Cache-Control': 'public, max-age=3600', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(DASHBOARD_GZ, mimetype='text/html', headers=headers)
+    return Response(DASHBOARD_BYTES, mimetype='text/html', headers=headers)
 
 # ===== Main Execution =====
 def start_background_tasks():
@@ -949,7 +1131,8 @@ if __name__ == '__main__':
     print("\nAPI endpoints:")
     print("  /data - JSON sensor data")
     print("  /api/status - System status")
-    print("  /distance_graph - Distance graph")
+    print("\nFor production, serve through wsgi.py instead:")
+    print("  gunicorn -w 1 -k gthread --threads 16 -b :5000 wsgi:app")
     print("=" * 60)
     
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
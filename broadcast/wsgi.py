@@ -0,0 +1,21 @@
+"""WSGI entry point for the radar dashboard (v2.0.py)
+
+Run from this directory with one threaded worker:
+
+    gunicorn -w 1 -k gthread --threads 16 -b :5000 wsgi:app
+
+Keep it to a single worker: the serial reader, camera thread and
+sensor_data all live in the one process, and a second worker would
+fight over /dev/ttyUSB0 and the camera.
+"""
+import importlib.util
+import os
+
+# "v2.0.py" is not an importable module name, so load it by path
+_spec = importlib.util.spec_from_file_location(
+    "radar_v2", os.path.join(os.path.dirname(os.path.abspath(__file__)), "v2.0.py"))
+radar_v2 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(radar_v2)
+
+radar_v2.start_background_tasks()
+app = radar_v2.app
@@ -1,8 +1,10 @@
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response
 import cv2
 import serial
 import threading
+import os
 import time
+import orjson
 
 app = Flask(__name__)
 
@@ -15,92 +17,184 @@ status = "SCANNING"
 last_event_time = 0
 hold_mode = False
 current_co2 = 400
+state_lock = threading.Lock()  # held by read_serial while updating, and by readers
+status_payload = orjson.dumps({'status': status, 'co2': current_co2})  # /get_status body
+
+STREAM_FPS = 15          # per-client frame rate cap
+JPEG_QUALITY = 70
+MOTION_THRESHOLD = 2.0   # mean abs diff (0-255) of 80x60 grayscale thumbnails
+CAMERA_TIMEOUT = 10      # s without camera frames before a stream ends
+
+# multipart MJPEG part framing
+JPEG_HDR = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+PART_END = b'\r\n'
 
 # Camera
-camera = cv2.VideoCapture(0)
+camera = cv2.VideoCapture(0, cv2.CAP_V4L2)
+camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))  # native UVC output, no YUYV
+camera.set(cv2.CAP_PROP_FPS, STREAM_FPS)  # no faster than the stream is served
+camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)    # keep only the newest frame in the driver
+
+def prioritize_serial_thread():
+    # Linux only; applies to the calling thread. Keeps the UART drained while
+    # JPEG encoding and request handling compete for the CPU.
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cores = os.sched_getaffinity(0)
+    if len(cores) > 1:
+        os.sched_setaffinity(0, {max(cores)})
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+    except PermissionError:
+        try:
+            os.nice(-10)
+        except PermissionError:
+            pass  # not root / no CAP_SYS_NICE: keep the default priority
 
 def read_serial():
-    global status, last_event_time, hold_mode, current_co2
+    global status, last_event_time, hold_mode, current_co2, status_payload
+    
+    prioritize_serial_thread()
+    pending = bytearray()
     
     while True:
-        now = time.time()
+        try:
+            # Read everything the driver has buffered in one call; blocks for
+            # up to the 1 s port timeout when idle, which paces the hold check
+            pending += ser.read(ser.in_waiting or 1)
+        except:
+            time.sleep(0.1)
         
-        # Your 5-second hold logic
-        if hold_mode and (now - last_event_time >= 5):
-            status = "SCANNING"
-            hold_mode = False
+        now = time.time()
         
-        try:
-            line = ser.readline().decode().strip()
-            if line and ',' in line:
-                parts = line.split(',')
-                if len(parts) == 2:
-                    human_status = parts[0]
-                    co2_str = parts[1]
-                    
+        with state_lock:
+            # Your 5-second hold logic
+            if hold_mode and (now - last_event_time >= 5):
+                status = "SCANNING"
+                hold_mode = False
+            
+            while b'\n' in pending:
+                raw, _, pending = pending.partition(b'\n')
+                # "HUMAN,<co2>" / "NO HUMAN,<co2>", parsed on the raw bytes
+                human_status, sep, co2_raw = raw.strip().partition(b',')
+                if sep and b',' not in co2_raw:
                     # Your original human logic
-                    if human_status == "HUMAN":
+                    if human_status == b"HUMAN":
                         status = "HUMAN"
                         last_event_time = now
                         hold_mode = True
-                    elif human_status == "NO HUMAN":
+                    elif human_status == b"NO HUMAN":
                         status = "NO HUMAN"
                         last_event_time = now
                         hold_mode = True
                     
                     # CO2 value
                     try:
-                        current_co2 = int(co2_str)
+                        current_co2 = int(co2_raw)
                     except:
                         pass
-                        
-        except:
-            pass
-        
-        time.sleep(0.1)
+            
+            # Serialize once per read; /get_status just returns the bytes
+            status_payload = orjson.dumps({'status': status, 'co2': current_co2})
 
 threading.Thread(target=read_serial, daemon=True).start()
 
 def generate_camera():
+    prev_small = None
+    prev_overlay = None
+    part = None  # last multipart part sent
+    last_frame = time.monotonic()  # last frame read from the camera
     while True:
+        start = time.monotonic()
         success, frame = camera.read()
         if not success:
+            # Camera gone: back off instead of spinning, and end the stream
+            # (freeing its thread) if it does not come back
+            if start - last_frame > CAMERA_TIMEOUT:
+                return
+            time.sleep(0.1)
             continue
+        last_frame = start
+        
+        # Skip the JPEG encode while the scene and overlay are unchanged and
+        # resend the last encoded part instead
+        with state_lock:
+            overlay = (status, current_co2)
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (80, 60),
+                           interpolation=cv2.INTER_AREA)
+        still = (part is not None and overlay == prev_overlay and
+                 cv2.absdiff(small, prev_small).mean() < MOTION_THRESHOLD)
         
-        # Add status text to camera feed
-        cv2.putText(frame, f"Status: {status}", (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.putText(frame, f"CO2: {current_co2} ppm", (10, 70), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+        if not still:
+            prev_small, prev_overlay = small, overlay
+            
+            # Add status text to camera feed
+            shown_status, shown_co2 = overlay
+            cv2.putText(frame, f"Status: {shown_status}", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.putText(frame, f"CO2: {shown_co2} ppm", (10, 70), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+            
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY,
+                                                       cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+            if ret:
+                # whole part built once per encode; resent as-is while still
+                part = b''.join((JPEG_HDR, memoryview(buffer), PART_END))
         
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        if part is not None:
+            yield part
+        
+        # Pace each client to STREAM_FPS instead of the camera's native rate
+        time.sleep(max(0, 1 / STREAM_FPS - (time.monotonic() - start)))
 
-@app.route('/')
-def index():
-    html = '''
+# Fully static page served as-is; the status line polls /get_status
+# instead of reloading the whole page (and camera stream) every second
+INDEX_HTML = '''
     <html>
     <head>
         <title>Human + CO2 Dashboard</title>
-        <meta http-equiv="refresh" content="1">
     </head>
     <body>
-        <h1>Status: <span style="color:red">STATUS_PLACEHOLDER</span></h1>
-        <h2>CO2: <span style="color:blue">CO2_PLACEHOLDER</span> ppm</h2>
+        <h1>Status: <span id="status" style="color:red">SCANNING</span></h1>
+        <h2>CO2: <span id="co2" style="color:blue">400</span> ppm</h2>
         <img src="/camera" width="640"/>
+        
+        <script>
+            function updateStatus() {
+                fetch('/get_status')
+                    .then(response => response.json())
+                    .then(data => {
+                        document.getElementById('status').textContent = data.status;
+                        document.getElementById('co2').textContent = data.co2;
+                    });
+            }
+            setInterval(updateStatus, 1000);
+            updateStatus();
+        </script>
     </body>
     </html>
     '''
-    html = html.replace('STATUS_PLACEHOLDER', status)
-    html = html.replace('CO2_PLACEHOLDER', str(current_co2))
-    return render_template_string(html)
+
+@app.route('/')
+def index():
+    return Response(INDEX_HTML, mimetype='text/html')
+
+@app.route('/get_status')
+def get_status():
+    return Response(status_payload, mimetype='application/json')
 
 @app.route('/camera')
 def camera_feed():
     return Response(generate_camera(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+# waitress serves every client from a fixed thread pool instead of Werkzeug's
+# thread-per-connection dev server. Each open tab holds one thread for its
+# /camera stream (the /get_status polls are short), so the pool supports
+# MAX_VIEWERS tabs plus a couple of spare threads for page loads and polls;
+# further tabs queue until a tab is closed. Keep it to one process: the serial
+# and camera state live in this module.
+MAX_VIEWERS = 6
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=5000, threads=MAX_VIEWERS + 2, channel_timeout=300)
\ No newline at end of file
@@ -1,75 +1,152 @@
 [file name]: dashboard_v2.py
 [file content begin]
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response
 import cv2
 import serial
 import threading
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-import io
+import os
+import numpy as np
+import orjson
 import time
+import queue
+import logging
+import logging.handlers
 from datetime import datetime
+from collections import deque
 
 # ====== Flask App ======
 app = Flask(__name__)
 
+# ====== Logging ======
+# The serial thread only enqueues records; a background listener formats and
+# writes them, so console I/O stays out of the read loop
+log_queue = queue.SimpleQueue()
+log_output = logging.StreamHandler()
+log_output.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', '%H:%M:%S'))
+logging.handlers.QueueListener(log_queue, log_output).start()
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.handlers.QueueHandler(log_queue))
+log.setLevel(logging.INFO)
+log.propagate = False  # waitress adds a root handler; don't print twice
+
 # ====== Serial Setup ======
 ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
 time.sleep(2)  # Wait for ESP32
 
+# ====== Parameters ======
+MAX_DATA_POINTS = 100  # Maximum points to display
+STATUS_DEBOUNCE = 5    # Number of consistent readings to change status
+STREAM_FPS = 15        # Per-client camera frame rate cap
+JPEG_QUALITY = 70
+MOTION_THRESHOLD = 2.0 # Mean abs diff (0-255) of 80x60 grayscale thumbnails
+CAMERA_TIMEOUT = 10    # Seconds without camera frames before a stream ends
+MAX_VIEWERS = 6        # Dashboard tabs served at once (see Run App)
+
+# ====== MJPEG Part Framing ======
+JPEG_HDR = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+PART_END = b'\r\n'
+
 # ====== Global Data ======
-co2_values = []  # Store CO2 values
+co2_values = deque(maxlen=MAX_DATA_POINTS)  # Store CO2 values (oldest drop off)
 human_status = False  # Current human detection status
 last_human_change = 0  # Time of last status change
-status_history = []  # History of status for debouncing
+status_history = deque(maxlen=STATUS_DEBOUNCE)  # History of status for debouncing
+status_true_count = 0  # Number of True readings currently in status_history
+
+# The data above is written by read_serial and read by the request threads;
+# both sides hold state_lock. state_seq is bumped on every batch of new
+# readings and /events clients wait on it through state_cv.
+state_lock = threading.Lock()
+state_cv = threading.Condition(state_lock)
+state_seq = 0
+
+def cache_payloads():
+    """Serialize once per batch of readings (state_lock held); handlers return the bytes as-is"""
+    global co2_payload, event_payload
+    co2_payload = orjson.dumps(list(co2_values))
+    event_payload = b'data: ' + orjson.dumps({'human': human_status,
+                                              'co2_values': list(co2_values)}) + b'\n\n'
+
+cache_payloads()
 
 # ====== Camera Setup ======
-camera = cv2.VideoCapture(0)
+camera = cv2.VideoCapture(0, cv2.CAP_V4L2)
+camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))  # native UVC output, no YUYV
 camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
 camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-# ====== Parameters ======
-MAX_DATA_POINTS = 100  # Maximum points to display
-STATUS_DEBOUNCE = 5    # Number of consistent readings to change status
+camera.set(cv2.CAP_PROP_FPS, STREAM_FPS)  # no faster than the stream is served
+camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)    # keep only the newest frame in the driver
 
 # ====== Serial Reading Thread ======
+def prioritize_serial_thread():
+    """Give the calling thread its own core and real-time priority (Linux only)
+    so the UART is drained while encoding and requests compete for the CPU"""
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cores = os.sched_getaffinity(0)
+    if len(cores) > 1:
+        os.sched_setaffinity(0, {max(cores)})
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+    except PermissionError:
+        try:
+            os.nice(-10)
+        except PermissionError:
+            pass  # not root / no CAP_SYS_NICE: keep the default priority
+
 def read_serial():
-    global co2_values, human_status, status_history
+    global human_status, status_true_count, state_seq
+    prioritize_serial_thread()
+    pending = bytearray()
     
     while True:
         try:
-            line = ser.readline().decode().strip()
+            # Read everything the driver has buffered in one call (block for
+            # 1 byte when idle) instead of readline()'s byte-at-a-time reads
+            pending += ser.read(ser.in_waiting or 1)
+            changed = False
             
-            if line and ',' in line:
-                parts = line.split(',')
-                if len(parts) == 2:
+            with state_lock:
+                while b'\n' in pending:
+                    raw, _, pending = pending.partition(b'\n')
+                    # "<co2>,<0|1>", parsed on the raw bytes
+                    co2_raw, sep, human_raw = raw.strip().partition(b',')
+                    if not sep or b',' in human_raw:
+                        continue
+                    
                     # Parse CO2 value
                     try:
-                        co2_val = float(parts[0])
-                        co2_values.append(co2_val)
-                        co2_values = co2_values[-MAX_DATA_POINTS:]  # Keep last N points
+                        co2_val = float(co2_raw)
+                        co2_values.append(co2_val)  # deque keeps the last N points
+                        changed = True
                     except ValueError:
                         continue
                     
                     # Parse human status
-                    new_status = parts[1].strip() == "1"
+                    new_status = human_raw.strip() == b"1"
                     
-                    # Debouncing logic
+                    # Debouncing logic: keep a running count of True readings
+                    # in the window instead of rescanning it on every line
+                    if len(status_history) == STATUS_DEBOUNCE:
+                        status_true_count -= status_history[0]  # about to drop off
                     status_history.append(new_status)
-                    if len(status_history) > STATUS_DEBOUNCE:
-                        status_history.pop(0)
+                    status_true_count += new_status
                     
-                    # Check if all recent readings are consistent
-                    if len(status_history) == STATUS_DEBOUNCE:
-                        all_same = all(s == status_history[0] for s in status_history)
-                        if all_same and status_history[0] != human_status:
-                            human_status = status_history[0]
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Human detected: {human_status}")
+                    # Recent readings are consistent when they are all True or all False
+                    if len(status_history) == STATUS_DEBOUNCE and status_true_count in (0, STATUS_DEBOUNCE):
+                        consistent = status_true_count == STATUS_DEBOUNCE
+                        if consistent != human_status:
+                            human_status = consistent
+                            log.info("Human detected: %s", human_status)
+                
+                if changed:
+                    cache_payloads()
+                    state_seq += 1
+                    state_cv.notify_all()
                     
         except Exception as e:
-            print(f"Serial read error: {e}")
+            log.warning("Serial read error: %s", e)
             time.sleep(0.1)
 
 # Start serial reading thread
@@ -77,149 +154,105 @@ threading.Thread(target=read_serial, daemon=True).start()
 
 # ====== Camera Frame Generator ======
 def generate_camera():
+    prev_small = None
+    prev_timestamp = None
+    part = None  # last multipart part sent
+    last_frame = time.monotonic()  # last frame read from the camera
     while True:
+        start = time.monotonic()
         success, frame = camera.read()
         if not success:
+            # Camera gone: back off instead of spinning, and end the stream
+            # (freeing its thread) if it does not come back
+            if start - last_frame > CAMERA_TIMEOUT:
+                return
+            time.sleep(0.1)
             continue
+        last_frame = start
         
-        # Add timestamp to frame
+        # Skip the JPEG encode while the scene is still and the timestamp has
+        # not ticked over; resend the last encoded part instead
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cv2.putText(frame, timestamp, (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (80, 60),
+                           interpolation=cv2.INTER_AREA)
+        still = (part is not None and timestamp == prev_timestamp and
+                 cv2.absdiff(small, prev_small).mean() < MOTION_THRESHOLD)
         
-        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-# ====== CO2 Graph Generator ======
-def generate_co2_graph():
-    plt.ioff()
-    fig, ax = plt.subplots(figsize=(8, 4))
-    fig.patch.set_facecolor('#f0f0f0')
-    
-    while True:
-        ax.clear()
-        
-        if co2_values:
-            # Plot CO2 data
-            x_values = list(range(len(co2_values)))
-            ax.plot(x_values, co2_values, color='green', linewidth=2, label='CO2 Level')
+        if not still:
+            prev_small, prev_timestamp = small, timestamp
             
-            # Add current value annotation
-            last_value = co2_values[-1] if co2_values else 0
-            ax.annotate(f'{last_value:.1f} ppm', 
-                       xy=(len(co2_values)-1, last_value),
-                       xytext=(len(co2_values)-15, last_value + 50),
-                       arrowprops=dict(arrowstyle='->', color='green'),
-                       fontsize=10, color='green')
+            # Add timestamp to frame
+            cv2.putText(frame, timestamp, (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
-            # Add threshold lines
-            ax.axhline(y=1000, color='orange', linestyle='--', alpha=0.5, label='Warning (1000 ppm)')
-            ax.axhline(y=2000, color='red', linestyle='--', alpha=0.5, label='Danger (2000 ppm)')
-        
-        # Chart formatting
-        ax.set_facecolor('white')
-        ax.set_title('CO2 Levels - Real Time', fontsize=14, fontweight='bold')
-        ax.set_xlabel('Sample Number', fontsize=10)
-        ax.set_ylabel('CO2 (ppm)', fontsize=10)
-        ax.grid(True, alpha=0.3)
-        ax.legend(loc='upper left')
-        
-        # Set y-axis limits
-        if co2_values:
-            max_val = max(co2_values) if max(co2_values) > 500 else 500
-            ax.set_ylim(0, max_val * 1.1)
-        else:
-            ax.set_ylim(0, 500)
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY,
+                                                       cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+            if ret:
+                # whole part built once per encode; resent as-is while still
+                part = b''.join((JPEG_HDR, memoryview(buffer), PART_END))
         
-        ax.set_xlim(0, max(len(co2_values), 50))
+        if part is not None:
+            yield part
         
-        # Save to buffer
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=100, bbox_inches='tight', facecolor=fig.get_facecolor())
-        buf.seek(0)
-        img_bytes = buf.read()
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/png\r\n\r\n' + img_bytes + b'\r\n')
-        
-        time.sleep(0.5)  # Update every 500ms
+        # Pace each client to STREAM_FPS instead of the camera's native rate
+        time.sleep(max(0, 1 / STREAM_FPS - (time.monotonic() - start)))
+
+# ====== Human Status Images ======
+CARD_SIZE = (640, 250)  # width, height of the status card in pixels
 
-# ====== Human Status Image Generator ======
-def generate_human_status():
-    plt.ioff()
+def hex_bgr(color):
+    """'#rrggbb' -> OpenCV BGR tuple"""
+    r, g, b = bytes.fromhex(color.lstrip('#'))
+    return (b, g, r)
+
+def put_centered(img, text, cy, font, scale, color, thickness):
+    (w, h), _ = cv2.getTextSize(text, font, scale, thickness)
+    org = ((img.shape[1] - w) // 2, cy + h // 2)
+    cv2.putText(img, text, org, font, scale, color, thickness, cv2.LINE_AA)
+
+def render_human_status(present):
+    """Render the status card for one state; called once per state at startup"""
+    width, height = CARD_SIZE
+    img = np.full((height, width, 3), hex_bgr('#f0f0f0'), np.uint8)
     
-    while True:
-        # Create figure for status display
-        fig, ax = plt.subplots(figsize=(8, 3))
-        fig.patch.set_facecolor('#f0f0f0')
-        ax.axis('off')  # Hide axes
-        
-        if human_status:
-            # Human Detected - Green background
-            ax.set_facecolor('#d4edda')
-            status_text = "HUMAN DETECTED"
-            text_color = '#155724'
-            border_color = 'green'
-            border_width = 3
-            font_size = 36
-        else:
-            # No Human - Red background
-            ax.set_facecolor('#f8d7da')
-            status_text = "NO HUMAN"
-            text_color = '#721c24'
-            border_color = 'red'
-            border_width = 2
-            font_size = 32
-        
-        # Add border
-        for spine in ax.spines.values():
-            spine.set_color(border_color)
-            spine.set_linewidth(border_width)
-        
-        # Add status text
-        ax.text(0.5, 0.5, status_text, 
-                ha='center', va='center', 
-                fontsize=font_size, fontweight='bold',
-                color=text_color,
-                transform=ax.transAxes)
-        
-        # Add timestamp
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        ax.text(0.02, 0.02, f"Last update: {timestamp}", 
-                fontsize=8, color='gray',
-                transform=ax.transAxes)
-        
-        # Add breathing detection info
-        info_text = "Breathing pattern monitoring active"
-        ax.text(0.5, 0.1, info_text, 
-                ha='center', va='center',
-                fontsize=10, style='italic', color='gray',
-                transform=ax.transAxes)
-        
-        # Save to buffer
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-        buf.seek(0)
-        img_bytes = buf.read()
-        plt.close(fig)  # Close figure to free memory
-        
-        yield (b'--frame\r\n'
-               b'Content-Type: image/png\r\n\r\n' + img_bytes + b'\r\n')
-        
-        time.sleep(0.5)  # Update every 500ms
+    if present:
+        # Human Detected - green text
+        status_text = "HUMAN DETECTED"
+        text_color = '#155724'
+        font_scale, thickness = 2.0, 4
+    else:
+        # No Human - red text
+        status_text = "NO HUMAN"
+        text_color = '#721c24'
+        font_scale, thickness = 1.8, 3
+    
+    # Add status text
+    put_centered(img, status_text, height // 2, cv2.FONT_HERSHEY_DUPLEX,
+                 font_scale, hex_bgr(text_color), thickness)
+    
+    # Add breathing detection info
+    put_centered(img, "Breathing pattern monitoring active", int(height * 0.9),
+                 cv2.FONT_HERSHEY_SIMPLEX | cv2.FONT_ITALIC, 0.5, hex_bgr('#808080'), 1)
+    
+    ok, png = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    return png.tobytes()
+
+# The card only ever shows one of two states, so render both once
+# (the page footer already shows the current time)
+STATUS_PNG = {True: render_human_status(True), False: render_human_status(False)}
 
 # ====== Routes ======
-@app.route('/')
-def index():
-    html = '''
+# Fully static page, served as-is (no Jinja parse per request)
+INDEX_HTML = '''
     <!DOCTYPE html>
     <html>
     <head>
         <title>ESP32 Monitoring Dashboard</title>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <!-- Chart.js 4.4.1 from static/ next to this script; pinned CDN copy if it is missing -->
+        <script src="/static/chart.umd.min.js"></script>
+        <script>window.Chart || document.write('<script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"><\\/script>')</script>
         <style>
             body {
                 font-family: Arial, sans-serif;
@@ -296,13 +329,13 @@ def index():
             
             <div class="card">
                 <h2>📊 CO2 Levels</h2>
-                <img src="/co2_graph" alt="CO2 Graph">
+                <canvas id="co2"></canvas>
             </div>
             
             <div class="card">
                 <h2>👤 Human Presence Status</h2>
                 <div class="status-container">
-                    <img src="/human_status" alt="Human Status">
+                    <img id="human" src="/human_status.png" alt="Human Status">
                 </div>
             </div>
         </div>
@@ -323,46 +356,115 @@ def index():
             setInterval(updateTime, 1000);
             updateTime();
             
-            // Auto-refresh images to prevent caching issues
-            function refreshImages() {
-                const images = document.querySelectorAll('img[src*="feed"], img[src*="graph"], img[src*="status"]');
-                images.forEach(img => {
-                    const src = img.src;
-                    img.src = '';
-                    setTimeout(() => { img.src = src; }, 100);
-                });
+            // New readings are pushed over SSE (/events) as they arrive
+            // instead of polling /co2_data; EventSource reconnects by itself.
+            // Opened before the chart so the human card still updates when
+            // Chart.js could not be loaded.
+            const es = new EventSource('/events');
+            es.onmessage = e => {
+                const data = JSON.parse(e.data);
+                updateCO2(data.co2_values);
+                updateHuman(data.human);
+            };
+            
+            // CO2 graph is drawn here from the pushed readings; the chart is
+            // built once and only its data is swapped on each message
+            const co2Chart = typeof Chart === 'undefined' ? null : new Chart(document.getElementById('co2'), {
+                type: 'line',
+                data: {
+                    labels: [],
+                    datasets: [
+                        { label: 'CO2 Level', data: [], borderColor: 'green', borderWidth: 2, pointRadius: 0 },
+                        { label: 'Warning (1000 ppm)', data: [], borderColor: 'orange', borderDash: [6, 4], borderWidth: 1, pointRadius: 0 },
+                        { label: 'Danger (2000 ppm)', data: [], borderColor: 'red', borderDash: [6, 4], borderWidth: 1, pointRadius: 0 }
+                    ]
+                },
+                options: {
+                    animation: false,
+                    scales: {
+                        x: { title: { display: true, text: 'Sample Number' } },
+                        y: { min: 0, title: { display: true, text: 'CO2 (ppm)' } }
+                    },
+                    plugins: { title: { display: true, text: 'CO2 Levels - Real Time' } }
+                }
+            });
+            
+            function updateCO2(values) {
+                if (!co2Chart) return;
+                co2Chart.data.labels = Array.from({ length: Math.max(values.length, 50) }, (_, i) => i);
+                co2Chart.data.datasets[0].data = values;
+                co2Chart.data.datasets[1].data = co2Chart.data.labels.map(() => 1000);
+                co2Chart.data.datasets[2].data = co2Chart.data.labels.map(() => 2000);
+                co2Chart.options.scales.y.max = Math.max(500, ...values) * 1.1;
+                co2Chart.update('none');
+            }
+            
+            // The status card is a plain PNG; re-fetch it only when the
+            // pushed human flag flips
+            let human = null;
+            function updateHuman(present) {
+                if (present === human) return;
+                human = present;
+                document.getElementById('human').src = '/human_status.png?t=' + Date.now();
             }
-            setInterval(refreshImages, 10000); // Refresh every 10 seconds
         </script>
     </body>
     </html>
     '''
-    return render_template_string(html)
+
+@app.route('/')
+def index():
+    return Response(INDEX_HTML, mimetype='text/html')
 
 @app.route('/camera_feed')
 def camera_feed():
     return Response(generate_camera(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/co2_graph')
-def co2_graph():
-    return Response(generate_co2_graph(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/co2_data')
+def co2_data():
+    return Response(co2_payload, mimetype='application/json')
 
-@app.route('/human_status')
-def human_status_feed():
-    return Response(generate_human_status(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+def generate_events():
+    # Server-Sent Events: one message per batch of new readings
+    seen = -1
+    while True:
+        with state_cv:
+            changed = state_cv.wait_for(lambda: state_seq != seen, timeout=15)
+            if changed:
+                seen = state_seq
+                payload = event_payload
+        # Comment line keeps idle connections open and surfaces dead clients
+        yield payload if changed else b": keepalive\n\n"
+
+@app.route('/events')
+def events():
+    return Response(generate_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/human_status.png')
+def human_status_image():
+    return Response(STATUS_PNG[human_status], mimetype='image/png',
+                    headers={'Cache-Control': 'no-store'})
 
 # ====== Run App ======
+# waitress serves every client from a fixed thread pool instead of Werkzeug's
+# thread-per-connection dev server. Each open dashboard tab holds two threads
+# for as long as it is open (camera and /events), so the pool supports
+# MAX_VIEWERS tabs plus a couple of spare threads for page loads and the
+# status card; further tabs queue until a tab is closed. Keep it to one
+# process: the serial and camera state live in this module.
 if __name__ == '__main__':
+    from waitress import serve
+    
     print("Starting ESP32 Monitoring Dashboard...")
     print("Open your browser and navigate to: http://localhost:8080")
     print("Press Ctrl+C to stop the server")
     
     try:
-        app.run(host='0.0.0.0', port=8080, threaded=True, debug=False)
-    except KeyboardInterrupt:
+        # returns (rather than raising) on Ctrl+C
+        serve(app, host='0.0.0.0', port=8080, threads=2 * MAX_VIEWERS + 2, channel_timeout=300)
+    finally:
         print("\nShutting down server...")
         camera.release()
         ser.close()
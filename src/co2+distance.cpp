@@ -0,0 +1,104 @@
+#include <Arduino.h>
+
+// CO2 + radar presence/distance for broadcast/v2.0.py
+#define CO2_PIN 34
+#define RADAR_PIN 32   // radar digital OUT
+
+// Binary frame for the dashboard (9 bytes, little-endian):
+// 0xAA, uint16 co2 ppm, uint8 presence, float32 distance m, CRC-8 of the 7 payload bytes
+#define FRAME_SYNC 0xAA
+#define SEND_INTERVAL_MS 50
+
+// Calibration values for ~6 meters (adjust slightly after testing)
+const unsigned long min_pw = 5000;      // µs for closest distance (~0 m)
+const unsigned long max_pw = 200000;    // µs for farthest distance (~6 m)
+const float min_dist = 0.0;             // m
+const float max_dist = 6.0;             // m
+const unsigned long humanThreshold = 15000; // µs, adjust after testing
+const unsigned long holdMs = 1000;      // keep the last reading this long
+
+bool lastState = LOW;
+unsigned long lastChange = 0;
+unsigned long pulseWidth = 0;
+unsigned long lowDuration = 0;
+
+bool human = false;
+float distance = 0.0;
+unsigned long lastDetection = 0;
+unsigned long lastSend = 0;
+
+uint8_t crc8(const uint8_t *data, size_t len) {
+  uint8_t crc = 0;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+float estimateDistance(unsigned long pw) {
+  pw = constrain(pw, min_pw, max_pw);
+  return min_dist + (pw - min_pw) * (max_dist - min_dist) / (max_pw - min_pw);
+}
+
+void setup() {
+  Serial.begin(115200);
+  delay(2000);  // Wait for serial
+  pinMode(CO2_PIN, INPUT);
+  pinMode(RADAR_PIN, INPUT);
+}
+
+void loop() {
+  // Radar pulse timing has to be polled continuously, so frames are sent on
+  // a millis() schedule instead of delay()
+  bool state = digitalRead(RADAR_PIN);
+  unsigned long now = micros();
+
+  if (state != lastState) {
+    unsigned long duration = now - lastChange;
+
+    if (lastState) pulseWidth = duration;   // HIGH pulse
+    else lowDuration = duration;            // LOW duration
+
+    lastChange = now;
+    lastState = state;
+
+    if (pulseWidth > 0 && lowDuration > 0) {
+      // Inverted logic: short pulse = human
+      human = pulseWidth < humanThreshold;
+      distance = human ? estimateDistance(pulseWidth) : 0.0;
+      lastDetection = millis();
+
+      pulseWidth = 0;
+      lowDuration = 0;
+    }
+  }
+
+  unsigned long ms = millis();
+  if (ms - lastSend < SEND_INTERVAL_MS) return;
+  lastSend = ms;
+
+  // No pulses for a while: nobody in range
+  if (ms - lastDetection > holdMs) {
+    human = false;
+    distance = 0.0;
+  }
+
+  // CO2 Reading (same scaling as co2+live.cpp)
+  int raw_co2 = analogRead(CO2_PIN);
+  float voltage = raw_co2 * (3.3 / 4095.0);
+  static float smooth_co2 = 0;
+  smooth_co2 = (smooth_co2 * 0.9) + (voltage * 0.1);
+  uint16_t co2_ppm = (uint16_t)constrain(smooth_co2 * 1000, 0, 65535);
+
+  // ESP32 is little-endian, as the reader expects
+  uint8_t frame[9];
+  frame[0] = FRAME_SYNC;
+  memcpy(frame + 1, &co2_ppm, 2);
+  frame[3] = human ? 1 : 0;
+  memcpy(frame + 4, &distance, 4);
+  frame[8] = crc8(frame + 1, 7);
+  Serial.write(frame, sizeof(frame));
+}
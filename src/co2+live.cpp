@@ -4,10 +4,28 @@
 #define CO2_PIN 34
 #define RADAR_PIN 23
 
+// Binary frame for the dashboard: 0xAA, float32 co2, float32 presence, CRC-8.
+// Every reader in broadcast/SIH2025 that listens to this sketch expects it.
+#define FRAME_SYNC 0xAA
+
+// Uncomment to print "co2,presence" text lines for the Arduino Serial Plotter
+// instead (the dashboards will ignore this output)
+// #define SERIAL_PLOTTER
+
+uint8_t crc8(const uint8_t *data, size_t len) {
+  uint8_t crc = 0;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
 void setup() {
   Serial.begin(115200);
   delay(2000);  // Wait for serial
-  Serial.println("CO2,Presence");
   pinMode(CO2_PIN, INPUT);
   pinMode(RADAR_PIN, INPUT_PULLDOWN);
 }
@@ -25,10 +43,21 @@ void loop() {
   int radar = digitalRead(RADAR_PIN);
   float presence = (radar == LOW) ? 100.0 : 0.0;
   
+  float co2_out = smooth_co2 * 1000;  // Scale CO2
+#ifdef SERIAL_PLOTTER
   // Serial Plotter output
-  Serial.print(smooth_co2 * 1000);  // Scale CO2
+  Serial.print(co2_out);
   Serial.print(",");
   Serial.println(presence);
+#else
+  // Dashboard output (ESP32 floats are little-endian, as the reader expects)
+  uint8_t frame[10];
+  frame[0] = FRAME_SYNC;
+  memcpy(frame + 1, &co2_out, 4);
+  memcpy(frame + 5, &presence, 4);
+  frame[9] = crc8(frame + 1, 8);
+  Serial.write(frame, sizeof(frame));
+#endif
   
   delay(50);
 }
@@ -1,12 +1,11 @@
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response
 import cv2
 import serial
 import threading
+import os
 import time
-import io
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import orjson
+from collections import deque
 
 app = Flask(__name__)
 
@@ -18,111 +17,172 @@ time.sleep(2)
 status = "SCANNING"
 last_event_time = 0
 hold_mode = False
-co2_values = []  # Store CO2 history for graph
+co2_values = deque(maxlen=50)  # Last 50 CO2 readings for the graph
 current_co2 = 400
 
+# Everything above is written by read_serial and read by the request
+# threads; both sides hold state_lock. state_seq is bumped whenever status
+# or CO2 changes and /events clients wait on it through state_cv.
+state_lock = threading.Lock()
+state_cv = threading.Condition(state_lock)
+state_seq = 0
+
+def cache_payloads():
+    # Serialize once per state change (state_lock held); handlers return the bytes as-is
+    global status_payload, co2_payload, event_payload
+    status_payload = orjson.dumps({'status': status, 'co2': current_co2})
+    co2_payload = orjson.dumps(list(co2_values))
+    event_payload = b'data: ' + orjson.dumps({'status': status, 'co2': current_co2,
+                                              'co2_values': list(co2_values)}) + b'\n\n'
+
+cache_payloads()
+
+STREAM_FPS = 15          # per-client frame rate cap
+JPEG_QUALITY = 70
+MOTION_THRESHOLD = 2.0   # mean abs diff (0-255) of 80x60 grayscale thumbnails
+CAMERA_TIMEOUT = 10      # s without camera frames before a stream ends
+
+# multipart MJPEG part framing
+JPEG_HDR = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+PART_END = b'\r\n'
+
 # Camera (NO PAGE REFRESH - realtime MJPEG)
-camera = cv2.VideoCapture(0)
+camera = cv2.VideoCapture(0, cv2.CAP_V4L2)
+camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))  # native UVC output, no YUYV
+camera.set(cv2.CAP_PROP_FPS, STREAM_FPS)  # no faster than the stream is served
+camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)    # keep only the newest frame in the driver
+
+def prioritize_serial_thread():
+    # Linux only; applies to the calling thread. Keeps the UART drained while
+    # JPEG encoding and request handling compete for the CPU.
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    cores = os.sched_getaffinity(0)
+    if len(cores) > 1:
+        os.sched_setaffinity(0, {max(cores)})
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+    except PermissionError:
+        try:
+            os.nice(-10)
+        except PermissionError:
+            pass  # not root / no CAP_SYS_NICE: keep the default priority
 
 def read_serial():
-    global status, last_event_time, hold_mode, current_co2, co2_values
+    global status, last_event_time, hold_mode, current_co2, state_seq
+    
+    prioritize_serial_thread()
+    pending = bytearray()
     
     while True:
-        now = time.time()
+        try:
+            # Read everything the driver has buffered in one call; blocks for
+            # up to the 1 s port timeout when idle, which paces the hold check
+            pending += ser.read(ser.in_waiting or 1)
+        except:
+            time.sleep(0.1)
         
-        # Your 5-second hold logic
-        if hold_mode and (now - last_event_time >= 5):
-            status = "SCANNING"
-            hold_mode = False
+        now = time.time()
+        changed = False
         
-        try:
-            line = ser.readline().decode().strip()
-            if line and ',' in line:
-                parts = line.split(',')
-                if len(parts) == 2:
-                    human_status = parts[0]
-                    co2_str = parts[1]
-                    
+        with state_lock:
+            # Your 5-second hold logic
+            if hold_mode and (now - last_event_time >= 5):
+                status = "SCANNING"
+                hold_mode = False
+                changed = True
+            
+            while b'\n' in pending:
+                raw, _, pending = pending.partition(b'\n')
+                # "HUMAN,<co2>" / "NO HUMAN,<co2>", parsed on the raw bytes
+                human_status, sep, co2_raw = raw.strip().partition(b',')
+                if sep and b',' not in co2_raw:
                     # Your original human logic
-                    if human_status == "HUMAN":
+                    if human_status == b"HUMAN":
+                        changed |= status != "HUMAN"
                         status = "HUMAN"
                         last_event_time = now
                         hold_mode = True
-                    elif human_status == "NO HUMAN":
+                    elif human_status == b"NO HUMAN":
+                        changed |= status != "NO HUMAN"
                         status = "NO HUMAN"
                         last_event_time = now
                         hold_mode = True
                     
                     # CO2 value
                     try:
-                        current_co2 = int(co2_str)
-                        co2_values.append(current_co2)
-                        # Keep last 50 readings for graph
-                        if len(co2_values) > 50:
-                            co2_values.pop(0)
+                        current_co2 = int(co2_raw)
+                        co2_values.append(current_co2)  # oldest reading drops off
+                        changed = True
                     except:
                         pass
-                        
-        except:
-            pass
-        
-        time.sleep(0.1)
+            
+            if changed:
+                cache_payloads()
+                state_seq += 1
+                state_cv.notify_all()
 
 threading.Thread(target=read_serial, daemon=True).start()
 
 # Realtime camera feed (MJPEG stream)
 def generate_camera():
+    prev_small = None
+    prev_overlay = None
+    part = None  # last multipart part sent
+    last_frame = time.monotonic()  # last frame read from the camera
     while True:
+        start = time.monotonic()
         success, frame = camera.read()
         if not success:
+            # Camera gone: back off instead of spinning, and end the stream
+            # (freeing its thread) if it does not come back
+            if start - last_frame > CAMERA_TIMEOUT:
+                return
+            time.sleep(0.1)
             continue
+        last_frame = start
         
-        # Add status overlay
-        color = (0, 255, 0) if status == "HUMAN" else (0, 0, 255) if status == "NO HUMAN" else (255, 255, 0)
-        cv2.putText(frame, f"Status: {status}", (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-        cv2.putText(frame, f"CO2: {current_co2} ppm", (10, 70), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+        # Skip the JPEG encode while the scene and overlay are unchanged and
+        # resend the last encoded part instead
+        with state_lock:
+            overlay = (status, current_co2)
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (80, 60),
+                           interpolation=cv2.INTER_AREA)
+        still = (part is not None and overlay == prev_overlay and
+                 cv2.absdiff(small, prev_small).mean() < MOTION_THRESHOLD)
         
-        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-# CO2 graph generator (realtime updating)
-def generate_co2_graph():
-    while True:
-        plt.ioff()
-        fig, ax = plt.subplots(figsize=(8, 3))
-        
-        if co2_values:
-            ax.plot(co2_values, 'g-', linewidth=2)
-            ax.fill_between(range(len(co2_values)), co2_values, alpha=0.3, color='green')
-            ax.set_ylim(300, max(co2_values + [2000]))
-        
-        ax.set_title("CO2 Levels (ppm)", fontsize=14)
-        ax.set_ylabel("ppm", fontsize=12)
-        ax.grid(True, alpha=0.3)
-        
-        # Save to bytes
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', dpi=80)
-        plt.close(fig)
-        buf.seek(0)
-        img_bytes = buf.read()
+        if not still:
+            prev_small, prev_overlay = small, overlay
+            
+            # Add status overlay
+            shown_status, shown_co2 = overlay
+            color = (0, 255, 0) if shown_status == "HUMAN" else (0, 0, 255) if shown_status == "NO HUMAN" else (255, 255, 0)
+            cv2.putText(frame, f"Status: {shown_status}", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+            cv2.putText(frame, f"CO2: {shown_co2} ppm", (10, 70), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+            
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY,
+                                                       cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+            if ret:
+                # whole part built once per encode; resent as-is while still
+                part = b''.join((JPEG_HDR, memoryview(buffer), PART_END))
         
-        yield (b'--frame\r\n'
-               b'Content-Type: image/png\r\n\r\n' + img_bytes + b'\r\n')
+        if part is not None:
+            yield part
         
-        time.sleep(1)  # Update graph every second
+        # Pace each client to STREAM_FPS instead of the camera's native rate
+        time.sleep(max(0, 1 / STREAM_FPS - (time.monotonic() - start)))
 
-@app.route('/')
-def index():
-    html = '''
+# Fully static page, served as-is (no Jinja parse per request)
+INDEX_HTML = '''
     <!DOCTYPE html>
     <html>
     <head>
         <title>Human Detection Dashboard</title>
+        <!-- Chart.js 4.4.1 from static/ next to this script; pinned CDN copy if it is missing -->
+        <script src="/static/chart.umd.min.js"></script>
+        <script>window.Chart || document.write('<script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"><\\/script>')</script>
         <style>
             body { font-family: Arial; margin: 20px; }
             .container { display: flex; flex-direction: column; align-items: center; }
@@ -144,46 +204,95 @@ def index():
             </div>
             <div class="graph">
                 <h2>CO2 Levels</h2>
-                <img src="/co2_graph" width="800">
+                <canvas id="co2" width="800" height="300"></canvas>
             </div>
         </div>
         
         <script>
-            // Update status without refreshing page
-            function updateStatus() {
-                fetch('/get_status')
-                    .then(response => response.json())
-                    .then(data => {
-                        const statusDiv = document.getElementById('status');
-                        statusDiv.textContent = `Status: ${data.status}`;
-                        statusDiv.className = 'status ' + 
-                            (data.status === 'HUMAN' ? 'human' : 
-                             data.status === 'NO HUMAN' ? 'nohuman' : 'scanning');
-                    });
-            }
+            // Status and CO2 are pushed by the server over SSE (/events) on
+            // every change; no polling. EventSource reconnects by itself.
+            // Opened before the chart so the status still updates when
+            // Chart.js could not be loaded.
+            const es = new EventSource('/events');
+            es.onmessage = e => update(JSON.parse(e.data));
             
-            // Update every 500ms
-            setInterval(updateStatus, 500);
-            updateStatus();
+            const co2Chart = typeof Chart === 'undefined' ? null : new Chart(document.getElementById('co2'), {
+                type: 'line',
+                data: { labels: [], datasets: [{
+                    data: [], borderColor: 'green', borderWidth: 2, pointRadius: 0,
+                    fill: true, backgroundColor: 'rgba(0, 128, 0, 0.3)'
+                }] },
+                options: {
+                    animation: false,
+                    responsive: false,
+                    scales: { y: { min: 300, title: { display: true, text: 'ppm' } } },
+                    plugins: {
+                        legend: { display: false },
+                        title: { display: true, text: 'CO2 Levels (ppm)' }
+                    }
+                }
+            });
+            
+            function update(data) {
+                const statusDiv = document.getElementById('status');
+                statusDiv.textContent = `Status: ${data.status}`;
+                statusDiv.className = 'status ' + 
+                    (data.status === 'HUMAN' ? 'human' : 
+                     data.status === 'NO HUMAN' ? 'nohuman' : 'scanning');
+                
+                if (!co2Chart) return;
+                const values = data.co2_values;
+                co2Chart.data.labels = values.map((_, i) => i);
+                co2Chart.data.datasets[0].data = values;
+                co2Chart.options.scales.y.max = Math.max(2000, ...values);
+                co2Chart.update('none');
+            }
         </script>
     </body>
     </html>
     '''
-    return render_template_string(html)
+
+@app.route('/')
+def index():
+    return Response(INDEX_HTML, mimetype='text/html')
 
 @app.route('/camera_feed')
 def camera_feed():
     return Response(generate_camera(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/co2_graph')
-def co2_graph():
-    return Response(generate_co2_graph(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/co2_data')
+def co2_data():
+    return Response(co2_payload, mimetype='application/json')
+
+def generate_events():
+    # Server-Sent Events: one message per state change instead of client polling
+    seen = -1
+    while True:
+        with state_cv:
+            changed = state_cv.wait_for(lambda: state_seq != seen, timeout=15)
+            if changed:
+                seen = state_seq
+                payload = event_payload
+        # Comment line keeps idle connections open and surfaces dead clients
+        yield payload if changed else b": keepalive\n\n"
+
+@app.route('/events')
+def events():
+    return Response(generate_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
 @app.route('/get_status')
 def get_status():
-    return {'status': status, 'co2': current_co2}
+    return Response(status_payload, mimetype='application/json')
 
+# waitress serves every client from a fixed thread pool instead of Werkzeug's
+# thread-per-connection dev server. Each open dashboard tab holds two threads
+# for as long as it is open (/camera_feed and /events), so the pool supports
+# MAX_VIEWERS tabs plus a couple of spare threads for page loads; further
+# tabs queue until a tab is closed. Keep it to one process: the serial and
+# camera state live in this module.
+MAX_VIEWERS = 6
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=5000, threads=2 * MAX_VIEWERS + 2, channel_timeout=300)
\ No newline at end of file